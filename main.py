@@ -1,15 +1,185 @@
 __author__ = 'Tofu Gang'
 
 from sys import argv, exit
-from PyQt5.QtWidgets import QApplication
-from src.main_window import MainWindow
+from argparse import ArgumentParser
 
 ################################################################################
 
-if __name__ == "__main__":
+def loadWorlds(maps):
+    """
+    Worlds of the map files, their compiled sidecars preloaded; the built-in
+    map without any.
+    """
+
+    from src.map_file import MapFile
+    from src.world import World
+
+    if not maps:
+        return [World.default()]
+    return [MapFile(path).world for path in maps]
+
+################################################################################
+
+def runHeadless(generations, populationSize, distanceBackend, selection, seed, workers=None, coordinator=None,
+                checkpoint=None, checkpointInterval=10, resume=None, pruning=False, maps=None):
+    """
+    Evolves the population without Qt on the first of the maps; one line of
+    counters per generation.
+    With workers, every generation is simulated by that many processes over
+    shared memory; with a coordinator address, by the workers connecting to
+    it. The state is saved to checkpoint every checkpointInterval
+    generations; resume continues from such a file. pruning exhausts the
+    hopeless dots early in a single process (approximate, see Evolution).
+    """
+
+    from src.distributed import DistributedEvolution, parseAddress
+    from src.evolution import Evolution
+    from src.shared_evolution import SharedEvolution
+
+    if coordinator is not None:
+        evolutionClass, kwargs = DistributedEvolution, {'address': parseAddress(coordinator)}
+    elif workers is not None:
+        evolutionClass, kwargs = SharedEvolution, {'workers': workers}
+    else:
+        evolutionClass, kwargs = Evolution, {'pruning': pruning}
+    if resume is not None:
+        evolution = evolutionClass.fromCheckpoint(resume, **kwargs)
+    else:
+        evolution = evolutionClass(loadWorlds(maps)[0], populationSize, Evolution.DistanceBackend(distanceBackend),
+                                   Evolution.Selection(selection), seed, **kwargs)
+    with evolution:
+        for _ in range(generations):
+            evolution.runGeneration()
+            print('gen: '+str(evolution.generationCount)
+                  +' won: '+str(evolution.wonCount)
+                  +' exh: '+str(evolution.exhaustedCount)
+                  +' ded: '+str(evolution.deadCount)
+                  +' vec: '+str(evolution.maxVectorsCount)
+                  +(' cut: '+str(evolution.counters.pruned)+' saved: '+str(evolution.counters.savedSteps) if pruning else ''),
+                  flush=True)
+            evolution.nextGeneration()
+            if checkpoint is not None and evolution.generationCount%checkpointInterval == 0:
+                evolution.saveCheckpoint(checkpoint)
+        if checkpoint is not None:
+            evolution.saveCheckpoint(checkpoint)
+
+################################################################################
+
+def runIslands(generations, populationSize, distanceBackend, selection, seed, islandsCount, migrationInterval, migrantsCount, workers,
+               maps=None):
+    """
+    Evolves islandsCount populations on the first of the maps in a process
+    pool; one line per migration.
+    """
+
+    from src.evolution import Evolution
+    from src.islands import Islands
+
+    def report(islands):
+        print('gen: '+str(islands.generationCount)
+              +' vec: '+str(min(island.maxVectorsCount for island in islands.islands))
+              +' best: '+str(islands.champion[0])
+              +' island: '+str(islands.champion[2]), flush=True)
+
+    islands = Islands(loadWorlds(maps)[0], islandsCount, populationSize, migrationInterval, migrantsCount, workers,
+                      Evolution.DistanceBackend(distanceBackend), Evolution.Selection(selection), seed)
+    islands.run(generations, report)
+
+################################################################################
+
+def runWorker(address):
+    """
+    Simulates batches for the coordinator listening at address.
+    """
+
+    from src.distributed import work, parseAddress
+
+    work(parseAddress(address))
+
+################################################################################
+
+def runPrewarm(maps=None):
+    """
+    Fills the disk cache with the precomputed structures of the maps.
+    """
+
+    from time import monotonic
+    from src.path_finding import prewarm
+
+    for world in loadWorlds(maps):
+        start = monotonic()
+        key, = prewarm([world])
+        print('map: '+key+' time: {:.2f} s'.format(monotonic()-start), flush=True)
+
+################################################################################
+
+def runCompile(maps):
+    """
+    Writes the compiled sidecar of every map file.
+    """
+
+    from time import monotonic
+    from src.map_file import MapFile
+
+    for path in maps:
+        start = monotonic()
+        mapFile = MapFile(path)
+        mapFile.compile()
+        print('map: '+path+' sidecar: '+mapFile.sidecarPath+' time: {:.2f} s'.format(monotonic()-start), flush=True)
+
+################################################################################
+
+def runWindow(populationSize, turbo=False, maps=None):
+    """
+    M switches between the maps.
+    """
+
+    from PyQt5.QtWidgets import QApplication
+    from src.main_window import MainWindow
+
     app = QApplication(argv)
-    window = MainWindow()
+    window = MainWindow(populationSize, turbo, loadWorlds(maps))
     window.show()
-    exit(app.exec_())
+    return app.exec_()
+
+################################################################################
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument('--headless', action='store_true', help='evolve without the window')
+    parser.add_argument('--generations', type=int, default=100, help='generations to evolve in the headless mode')
+    parser.add_argument('--population', type=int, default=100, help='dots per generation')
+    parser.add_argument('--distance', choices=['oracle', 'field'], default='oracle', help='goal distance backend of the fitness function')
+    parser.add_argument('--selection', choices=['roulette', 'sus', 'tournament'], default='roulette', help='parent selection mode')
+    parser.add_argument('--seed', type=int, default=None, help='seed of the random generator')
+    parser.add_argument('--islands', type=int, default=1, help='independent populations evolved in a process pool (headless)')
+    parser.add_argument('--migration-interval', type=int, default=10, help='generations between two migrations of the islands')
+    parser.add_argument('--migrants', type=int, default=2, help='genomes migrating from every island')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes of the islands (one per core by default) or of one shared-memory population')
+    parser.add_argument('--coordinator', metavar='ADDRESS', default=None, help='evolve headless on the workers connecting to host:port or a Unix socket path')
+    parser.add_argument('--worker', metavar='ADDRESS', default=None, help='simulate batches for the coordinator at host:port or a Unix socket path')
+    parser.add_argument('--checkpoint', metavar='PATH', default=None, help='file the headless evolution is periodically saved to')
+    parser.add_argument('--checkpoint-interval', type=int, default=10, help='generations between two checkpoints')
+    parser.add_argument('--resume', metavar='PATH', default=None, help='continue the headless evolution saved in a checkpoint')
+    parser.add_argument('--pruning', action='store_true', help='exhaust early the dots that can no longer reach the goal; approximate, the pruned dots are scored where they stop (headless, single process)')
+    parser.add_argument('--turbo', action='store_true', help='start the window in the fast-forward mode (T toggles it)')
+    parser.add_argument('--map', metavar='PATH', action='append', dest='maps', help='JSON map file, repeat to switch between them with M (built-in map by default)')
+    parser.add_argument('--compile', action='store_true', help='write the precompiled sidecars of the maps, then exit')
+    parser.add_argument('--prewarm', action='store_true', help='precompute and cache the map graphs and distance fields, then exit')
+    args = parser.parse_args()
+    if args.compile:
+        runCompile(args.maps or [])
+    elif args.prewarm:
+        runPrewarm(args.maps)
+    elif args.worker is not None:
+        runWorker(args.worker)
+    elif args.headless and args.islands > 1:
+        runIslands(args.generations, args.population, args.distance, args.selection, args.seed,
+                   args.islands, args.migration_interval, args.migrants, args.workers, args.maps)
+    elif args.headless:
+        runHeadless(args.generations, args.population, args.distance, args.selection, args.seed, args.workers,
+                    args.coordinator, args.checkpoint, args.checkpoint_interval, args.resume, args.pruning, args.maps)
+    else:
+        exit(runWindow(args.population, args.turbo, args.maps))
 
 ################################################################################
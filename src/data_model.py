@@ -2,60 +2,132 @@ __author__ = 'Tofu Gang'
 
 from PyQt5.QtWidgets import QGraphicsScene
 from PyQt5.QtCore import QRectF, QPointF, Qt
-from PyQt5.QtGui import QPen
-from src.path_finding import VisibilityGraph
+from PyQt5.QtGui import QPainter, QPen, QPicture
+from enum import Enum
+from src.path_finding import DynamicVisibilityGraph, VisibilityGraph
 from src.population import Population
+from src.world import World
 
 ################################################################################
 
 class DataModel(QGraphicsScene):
-    WIDTH = 800
-    HEIGHT = 800
-    WALL_THICKNESS = 5
-    ALLOWED_AREA = QRectF(QPointF(-WIDTH/2, -HEIGHT/2), QPointF(WIDTH/2, HEIGHT/2))
-    START_POINT = QPointF(0, HEIGHT/2-20)
-    GOAL_POINT = QPointF(0, -HEIGHT / 2 + 20)
-    GOAL_TOLERANCE = 50
+    WORLD = World.default()
+    POPULATION_SIZE = Population.POPULATION_SIZE
+    WIDTH = World.WIDTH
+    HEIGHT = World.HEIGHT
+    ALLOWED_AREA = QRectF(QPointF(*WORLD.allowedArea[:2]), QPointF(*WORLD.allowedArea[2:]))
+    START_POINT = QPointF(*WORLD.startPoint)
+    GOAL_POINT = QPointF(*WORLD.goalPoint)
+    GOAL_TOLERANCE = WORLD.goalTolerance
     # walls around the allowed area
-    WALLS_SURROUNDING = []
-    # left
-    WALLS_SURROUNDING.append(QRectF(QPointF(ALLOWED_AREA.left()-WALL_THICKNESS, ALLOWED_AREA.top()-WALL_THICKNESS),
-                                    QPointF(ALLOWED_AREA.left(), ALLOWED_AREA.bottom()+WALL_THICKNESS)))
-    # right
-    WALLS_SURROUNDING.append(QRectF(QPointF(ALLOWED_AREA.right(), ALLOWED_AREA.top()-WALL_THICKNESS),
-                                    QPointF(ALLOWED_AREA.right()+WALL_THICKNESS, ALLOWED_AREA.bottom()+WALL_THICKNESS)))
-    # top
-    WALLS_SURROUNDING.append(QRectF(QPointF(ALLOWED_AREA.left()-WALL_THICKNESS, ALLOWED_AREA.top()-WALL_THICKNESS),
-                                    QPointF(ALLOWED_AREA.right()+WALL_THICKNESS, ALLOWED_AREA.top())))
-    # bottom
-    WALLS_SURROUNDING.append(QRectF(QPointF(ALLOWED_AREA.left()-WALL_THICKNESS, ALLOWED_AREA.bottom()),
-                                    QPointF(ALLOWED_AREA.right()+WALL_THICKNESS, ALLOWED_AREA.bottom()+WALL_THICKNESS)))
+    WALLS_SURROUNDING = [QRectF(QPointF(left, top), QPointF(right, bottom)) for left, top, right, bottom in WORLD.wallsSurrounding]
     # custom walls
-    WALLS_CUSTOM = []
-    WALLS_CUSTOM.append(QRectF(QPointF(ALLOWED_AREA.left()-WALL_THICKNESS, HEIGHT/4), QPointF(ALLOWED_AREA.left()+WIDTH-100, HEIGHT/4+WALL_THICKNESS)))
-    WALLS_CUSTOM.append(QRectF(QPointF(ALLOWED_AREA.left()+100, 0), QPointF(ALLOWED_AREA.right()+WALL_THICKNESS, WALL_THICKNESS)))
-    VISIBILITY_GRAPH = VisibilityGraph(START_POINT, GOAL_POINT, WALLS_CUSTOM+WALLS_SURROUNDING, ALLOWED_AREA)
+    WALLS_CUSTOM = [QRectF(QPointF(left, top), QPointF(right, bottom)) for left, top, right, bottom in WORLD.wallsCustom]
+    # a right button drag shorter than this in either direction is a click
+    WALL_SIZE_MIN = 2
+
+    class Layer(Enum):
+        BACKGROUND = 0
+        WALLS = 1
+        GRAPH = 2
+        ROUTE = 3
 
 ################################################################################
 
-    def __init__(self):
+    def __init__(self, populationSize=POPULATION_SIZE, turbo=False, worlds=None):
         """
-
+        turbo starts the population in the fast-forward mode; T toggles it.
+        worlds: maps to switch between with M, the first one is shown; the
+        built-in map by default
         """
 
         super().__init__()
-        self.setSceneRect(self.ALLOWED_AREA)
-        self._population = Population(self)
+        self._worlds = worlds or [self.WORLD]
+        self._worldIndex = 0
+        self._setShapes(self._worlds[0])
+        self._population = Population(self, populationSize)
         self._generationCountItem = self.addSimpleText('gen: '+str(self._population.generationCount))
-        self._generationCountItem.setPos(QPointF(-self.WIDTH/2+20, -self.HEIGHT/2+20))
         self._wonCountItem = self.addSimpleText('won: '+str(self._population.wonCount))
-        self._wonCountItem.setPos(QPointF(-self.WIDTH/2+20, -self.HEIGHT/2+40))
         self._exhaustedCountItem = self.addSimpleText('exh: '+str(self._population.exhaustedCount))
-        self._exhaustedCountItem.setPos(QPointF(-self.WIDTH/2+20, -self.HEIGHT/2+60))
         self._deadCountItem = self.addSimpleText('ded: '+str(self._population.deadCount))
-        self._deadCountItem.setPos(QPointF(-self.WIDTH/2+20, -self.HEIGHT/2+80))
+        self._solvedAfterItem = self.addSimpleText('sol: -')
+        self._placeCounters()
+        self._population.turbo = turbo
         self._population.updateCounters.connect(self._updateCounters)
         self._ctrlFlag = False
+        # static parts of the scene recorded once, see _layer()
+        self._layers = {}
+        self._visibilityGraph = None
+        # a right button drag draws a new custom wall
+        self._wallOrigin = None
+        self._wallPreview = self.addRect(QRectF(), QPen(Qt.red, 1, Qt.DashLine))
+        self._wallPreview.hide()
+
+################################################################################
+
+    def setWorld(self, world):
+        """
+        Switches the scene and the population to another map. Nothing is
+        recomputed for a map whose compiled sidecar was loaded (see MapFile).
+        """
+
+        self._setShapes(world)
+        self._visibilityGraph = None
+        self.invalidateLayers()
+        self._population.setWorld(world)
+        self._placeCounters()
+
+################################################################################
+
+    def _setShapes(self, world):
+        """
+        The scene counterparts of the world being shown.
+        """
+
+        self._world = world
+        self._allowedArea = QRectF(QPointF(*world.allowedArea[:2]), QPointF(*world.allowedArea[2:]))
+        self._startPoint = QPointF(*world.startPoint)
+        self._goalPoint = QPointF(*world.goalPoint)
+        self._goalTolerance = world.goalTolerance
+        self._wallsSurrounding = [QRectF(QPointF(left, top), QPointF(right, bottom)) for left, top, right, bottom in world.wallsSurrounding]
+        self._wallsCustom = [QRectF(QPointF(left, top), QPointF(right, bottom)) for left, top, right, bottom in world.wallsCustom]
+        self.setSceneRect(self._allowedArea)
+
+################################################################################
+
+    @property
+    def world(self):
+        """
+        The map being shown, with the walls added and removed so far.
+        """
+
+        return self._world
+
+################################################################################
+
+    def _placeCounters(self):
+        """
+        Counters go to the top left corner of the allowed area.
+        """
+
+        items = [self._generationCountItem, self._wonCountItem, self._exhaustedCountItem, self._deadCountItem,
+                 self._solvedAfterItem]
+        for index, item in enumerate(items):
+            item.setPos(self._allowedArea.topLeft()+QPointF(20, 20*(index+1)))
+
+################################################################################
+
+    @property
+    def visibilityGraph(self):
+        """
+        Graph of the shortest route, built (or loaded from the disk cache)
+        when first drawn.
+        """
+
+        if self._visibilityGraph is None:
+            world = self._world
+            self._visibilityGraph = VisibilityGraph(world.startPoint, world.goalPoint, world.walls, world.allowedArea)
+        return self._visibilityGraph
 
 ################################################################################
 
@@ -64,21 +136,117 @@ class DataModel(QGraphicsScene):
 
         """
 
-        self._generationCountItem.setText('gen: '+str(self._population.generationCount))
-        self._wonCountItem.setText('won: '+str(self._population.wonCount))
-        self._exhaustedCountItem.setText('exh: '+str(self._population.exhaustedCount))
-        self._deadCountItem.setText('ded: '+str(self._population.deadCount))
+        counters = self._population.counters
+        self._generationCountItem.setText('gen: '+str(counters.generation))
+        self._wonCountItem.setText('won: '+str(counters.won))
+        self._exhaustedCountItem.setText('exh: '+str(counters.exhausted))
+        self._deadCountItem.setText('ded: '+str(counters.dead))
+        solvedAfter = self._population.solvedAfter
+        self._solvedAfterItem.setText('sol: '+('-' if solvedAfter is None else '{:.1f} s'.format(solvedAfter)))
 
 ################################################################################
 
     def mousePressEvent(self, event):
         """
-
+        The right button edits the walls, see mouseReleaseEvent().
         """
 
+        if event.button() == Qt.RightButton:
+            self._wallOrigin = event.scenePos()
+            self._wallPreview.setRect(QRectF(self._wallOrigin, self._wallOrigin))
+            self._wallPreview.show()
+            return
         self._population.start()
         super().mousePressEvent(event)
 
+################################################################################
+
+    def mouseMoveEvent(self, event):
+        """
+
+        """
+
+        if self._wallOrigin is not None:
+            self._wallPreview.setRect(QRectF(self._wallOrigin, event.scenePos()).normalized())
+            return
+        super().mouseMoveEvent(event)
+
+################################################################################
+
+    def mouseReleaseEvent(self, event):
+        """
+        A right button drag adds the custom wall it spans, a right click
+        removes the custom wall under the cursor.
+        """
+
+        if event.button() == Qt.RightButton and self._wallOrigin is not None:
+            rect = QRectF(self._wallOrigin, event.scenePos()).normalized()
+            self._wallOrigin = None
+            self._wallPreview.hide()
+            if rect.width() >= self.WALL_SIZE_MIN and rect.height() >= self.WALL_SIZE_MIN:
+                self.addWall((rect.left(), rect.top(), rect.right(), rect.bottom()))
+            else:
+                wall = self._customWallAt(event.scenePos())
+                if wall is not None:
+                    self.removeWall(wall)
+            return
+        super().mouseReleaseEvent(event)
+
+################################################################################
+
+    def addWall(self, wall):
+        """
+        Adds a (left, top, right, bottom) custom wall to the map, see
+        _editWalls().
+        """
+
+        self._population.addWall(wall)
+        self._editWalls(lambda graph: graph.addWall(wall))
+
+################################################################################
+
+    def removeWall(self, wall):
+        """
+        Removes a custom wall of the map; ValueError if there is no such wall.
+        See _editWalls().
+        """
+
+        self._population.removeWall(wall)
+        self._editWalls(lambda graph: graph.removeWall(wall))
+
+################################################################################
+
+    def _editWalls(self, change):
+        """
+        Takes over the walls the population now evolves against. A visibility
+        graph that was drawn already is updated incrementally: the first edit
+        turns it into a DynamicVisibilityGraph of the old walls and applies
+        change to it.
+        """
+
+        world = self._world
+        if self._visibilityGraph is not None:
+            if not isinstance(self._visibilityGraph, DynamicVisibilityGraph):
+                self._visibilityGraph = DynamicVisibilityGraph(world.startPoint, world.goalPoint, world.walls,
+                                                               world.allowedArea)
+            change(self._visibilityGraph)
+        self._setShapes(self._population.world)
+        self.invalidateLayers()
+
+################################################################################
+
+    def _customWallAt(self, point):
+        """
+        (left, top, right, bottom) of the topmost custom wall containing the
+        scene point; None if there is none.
+        """
+
+        for wall in reversed(self._world.wallsCustom):
+            left, top, right, bottom = wall
+            if left <= point.x() <= right and top <= point.y() <= bottom:
+                return wall
+        return None
+
 ################################################################################
 
     def keyPressEvent(self, event):
@@ -90,6 +258,11 @@ class DataModel(QGraphicsScene):
         if key == Qt.Key_Control:
             self._ctrlFlag = True
             self.update()
+        elif key == Qt.Key_T:
+            self._population.turbo = not self._population.turbo
+        elif key == Qt.Key_M and len(self._worlds) > 1:
+            self._worldIndex = (self._worldIndex+1)%len(self._worlds)
+            self.setWorld(self._worlds[self._worldIndex])
         super().keyPressEvent(event)
 
 ################################################################################
@@ -105,6 +278,63 @@ class DataModel(QGraphicsScene):
             self.update()
         super().keyReleaseEvent(event)
 
+################################################################################
+
+    def invalidateLayers(self):
+        """
+        Drops the recorded static layers; to be called whenever the map
+        changes. The views cache the background (see MainWindow), so all
+        they show is invalidated explicitly; update() alone would keep the
+        old one.
+        """
+
+        self._layers.clear()
+        rect = self.sceneRect()
+        for view in self.views():
+            rect = rect.united(view.mapToScene(view.viewport().rect()).boundingRect())
+        self.invalidate(rect, QGraphicsScene.AllLayers)
+
+################################################################################
+
+    def _layer(self, layer):
+        """
+        QPicture of the layer, recorded on first use. Replaying it is a single
+        call, so the cost of a frame depends on the dots only.
+        """
+
+        picture = self._layers.get(layer)
+        if picture is None:
+            picture = QPicture()
+            painter = QPainter(picture)
+            if layer is self.Layer.BACKGROUND:
+                painter.setPen(Qt.gray)
+                painter.setBrush(Qt.white)
+                painter.drawRect(self._allowedArea)
+                painter.setPen(Qt.blue)
+                painter.setBrush(Qt.blue)
+                painter.drawEllipse(self._startPoint, 5, 5)
+                painter.setPen(Qt.green)
+                painter.setBrush(Qt.green)
+                painter.drawEllipse(self._goalPoint, self._goalTolerance, self._goalTolerance)
+            elif layer is self.Layer.WALLS:
+                painter.setPen(QPen(Qt.red, 1, join=Qt.MiterJoin))
+                painter.setBrush(Qt.red)
+                for rect in self._wallsSurrounding:
+                    painter.drawRect(rect)
+                for rect in self._wallsCustom:
+                    painter.drawRect(rect)
+            elif layer is self.Layer.GRAPH:
+                painter.setPen(Qt.black)
+                for point1, point2 in self.visibilityGraph.edges:
+                    painter.drawLine(QPointF(*point1), QPointF(*point2))
+            elif layer is self.Layer.ROUTE:
+                painter.setPen(Qt.green)
+                for point1, point2 in self.visibilityGraph.shortestRouteEdges:
+                    painter.drawLine(QPointF(*point1), QPointF(*point2))
+            painter.end()
+            self._layers[layer] = picture
+        return picture
+
 ################################################################################
 
     def drawBackground(self, painter, rect):
@@ -112,17 +342,8 @@ class DataModel(QGraphicsScene):
 
         """
 
-        painter.setPen(Qt.gray)
-        painter.setBrush(Qt.gray)
-        painter.drawRect(rect)
-        painter.setBrush(Qt.white)
-        painter.drawRect(self.ALLOWED_AREA)
-        painter.setPen(Qt.blue)
-        painter.setBrush(Qt.blue)
-        painter.drawEllipse(self.START_POINT, 5, 5)
-        painter.setPen(Qt.green)
-        painter.setBrush(Qt.green)
-        painter.drawEllipse(self.GOAL_POINT, self.GOAL_TOLERANCE, self.GOAL_TOLERANCE)
+        painter.fillRect(rect, Qt.gray)
+        painter.drawPicture(0, 0, self._layer(self.Layer.BACKGROUND))
         painter.setPen(Qt.black)
         super().drawBackground(painter, rect)
 
@@ -133,20 +354,8 @@ class DataModel(QGraphicsScene):
 
         """
 
-        painter.setPen(QPen(Qt.red, 1, join=Qt.MiterJoin))
-        painter.setBrush(Qt.red)
-        for rect in self.WALLS_SURROUNDING:
-            painter.drawRect(rect)
-        for rect in self.WALLS_CUSTOM:
-            painter.drawRect(rect)
-        if self._ctrlFlag:
-            painter.setPen(Qt.green)
-            for edge in self.VISIBILITY_GRAPH.shortestRouteEdges:
-                painter.drawLine(edge)
-        else:
-            painter.setPen(Qt.black)
-            for edge in self.VISIBILITY_GRAPH.edges:
-                painter.drawLine(edge)
+        painter.drawPicture(0, 0, self._layer(self.Layer.WALLS))
+        painter.drawPicture(0, 0, self._layer(self.Layer.ROUTE if self._ctrlFlag else self.Layer.GRAPH))
         super().drawForeground(painter, rect)
 
 ################################################################################
@@ -0,0 +1,366 @@
+__author__ = 'Tofu Gang'
+
+import json
+import numpy as np
+import socket
+from collections import deque
+from contextlib import suppress
+from os import unlink
+from queue import Queue, Empty
+from struct import Struct
+from threading import Condition, Lock, Thread
+from src.evolution import Evolution
+from src.path_finding import GoalDistanceOracle, DistanceField, WallIndex
+from src.simulation import Simulation
+from src.world import World
+
+################################################################################
+
+class Coordinator():
+    """
+    Hands batches of genomes out to worker processes connected over TCP or a
+    Unix socket and collects their outcomes and fitness. Every worker keeps up
+    to PIPELINE_DEPTH batches in flight; the batches of a worker whose
+    connection breaks are queued again for the others.
+
+    Addresses are (host, port) tuples for TCP and paths for Unix sockets.
+    """
+
+    BATCH_SIZE = 256
+    PIPELINE_DEPTH = 2
+    # seconds an idle worker thread waits for a batch before checking whether
+    # the coordinator was closed
+    POLL_INTERVAL = 0.5
+
+################################################################################
+
+    def __init__(self, world, distanceBackend=Evolution.DistanceBackend.ORACLE, address=('127.0.0.1', 0)):
+        """
+
+        """
+
+        self._world = world
+        self._distanceBackend = distanceBackend
+        family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+        self._server = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_INET:
+            self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind(address)
+        self._server.listen()
+        self._address = self._server.getsockname()
+        self._closed = False
+        self._queue = Queue()
+        self._lock = Lock()
+        self._done = Condition(self._lock)
+        self._workersCount = 0
+        Thread(target=self._accept, daemon=True).start()
+
+################################################################################
+
+    @property
+    def address(self):
+        """
+        Address the workers connect to.
+        """
+
+        return self._address
+
+################################################################################
+
+    @property
+    def workersCount(self):
+        """
+        Currently connected workers.
+        """
+
+        return self._workersCount
+
+################################################################################
+
+    def __enter__(self):
+        """
+
+        """
+
+        return self
+
+################################################################################
+
+    def __exit__(self, *args):
+        """
+
+        """
+
+        self.close()
+
+################################################################################
+
+    def close(self):
+        """
+        Disconnects the workers and stops listening.
+        """
+
+        self._closed = True
+        self._server.close()
+        if isinstance(self._address, str):
+            with suppress(FileNotFoundError):
+                unlink(self._address)
+
+################################################################################
+
+    def evaluate(self, angles, maxVectorsCount):
+        """
+        Simulates every row of the genome angles on the workers; returns the
+        final Simulation.Snapshot and the fitness. Batches dispatched after a
+        win are limited to the best winner's steps found so far, so results
+        may differ from a single simulation only by dots finishing after the
+        first win (see DistributedEvolution.runGeneration).
+        """
+
+        angles = np.ascontiguousarray(angles)
+        count = len(angles)
+        job = {'angles': angles,
+               'maxVectorsCount': maxVectorsCount,
+               'snapshot': Simulation.Snapshot(np.empty((count, 2)), np.empty((count, 2)), np.empty((count, 2)),
+                                               np.empty(count), np.empty(count, dtype=np.int64),
+                                               np.empty(count, dtype=np.int8)),
+               'fitness': np.empty(count),
+               'remaining': set()}
+        with self._lock:
+            for start in range(0, count, self.BATCH_SIZE):
+                job['remaining'].add(start)
+                self._queue.put((job, start, min(start+self.BATCH_SIZE, count)))
+            while job['remaining']:
+                self._done.wait()
+        return job['snapshot'], job['fitness']
+
+################################################################################
+
+    def _accept(self):
+        """
+        Background thread: one serving thread per connected worker.
+        """
+
+        description = dict(self._world.description(), type='world', distanceBackend=self._distanceBackend.value)
+        while not self._closed:
+            try:
+                connection, _ = self._server.accept()
+            except OSError:
+                break
+            try:
+                send(connection, description)
+            except OSError:
+                connection.close()
+                continue
+            Thread(target=self._serve, args=(connection,), daemon=True).start()
+
+################################################################################
+
+    def _serve(self, connection):
+        """
+        Serving thread of one worker: keeps its pipeline full and stores the
+        results; on a broken connection its batches in flight go back to the
+        queue.
+        """
+
+        with self._lock:
+            self._workersCount += 1
+        inFlight = deque()
+        try:
+            while not self._closed:
+                while len(inFlight) < self.PIPELINE_DEPTH:
+                    try:
+                        # don't block while results are due
+                        batch = self._queue.get(timeout=self.POLL_INTERVAL) if not inFlight else self._queue.get_nowait()
+                    except Empty:
+                        break
+                    job, start, stop = batch
+                    inFlight.append(batch)
+                    send(connection, {'type': 'batch', 'maxVectorsCount': job['maxVectorsCount']},
+                         {'angles': job['angles'][start:stop]})
+                if not inFlight:
+                    continue
+                _, arrays = receive(connection)
+                job, start, stop = inFlight.popleft()
+                with self._lock:
+                    for name, values in zip(Simulation.Snapshot._fields, job['snapshot']):
+                        values[start:stop] = arrays[name]
+                    job['fitness'][start:stop] = arrays['fitness']
+                    won = arrays['states'] == Simulation.State.WON.value
+                    if won.any():
+                        job['maxVectorsCount'] = min(job['maxVectorsCount'], int(arrays['steps'][won].min()))
+                    job['remaining'].discard(start)
+                    self._done.notify_all()
+            send(connection, {'type': 'stop'})
+        except (OSError, ValueError):
+            pass
+        finally:
+            connection.close()
+            with self._lock:
+                self._workersCount -= 1
+            [self._queue.put(batch) for batch in inFlight]
+
+################################################################################
+
+class DistributedEvolution(Evolution):
+    """
+    Evolution whose generations are simulated and evaluated by remote workers
+    through a Coordinator; selection and mutation stay local.
+    """
+
+    # the remote workers keep the map they were started with
+    WALLS_FIXED = True
+
+################################################################################
+
+    def __init__(self, world, populationSize=Evolution.POPULATION_SIZE, distanceBackend=Evolution.DistanceBackend.ORACLE,
+                 selection=Evolution.Selection.ROULETTE, seed=None, address=('127.0.0.1', 0)):
+        """
+
+        """
+
+        # the generations are simulated elsewhere, from the start
+        super().__init__(world, populationSize, distanceBackend, selection, seed, None)
+        self._coordinator = Coordinator(world, distanceBackend, address)
+
+################################################################################
+
+    @property
+    def coordinator(self):
+        """
+
+        """
+
+        return self._coordinator
+
+################################################################################
+
+    def close(self):
+        """
+
+        """
+
+        self._coordinator.close()
+
+################################################################################
+
+    def runGeneration(self):
+        """
+        Simulates the generation on the workers. The batches run
+        independently, so a win shortens the others only once it's known:
+        the dots that still ran past the best winner's steps are simulated
+        again with that limit, which gives the single process outcome.
+        """
+
+        angles = self._genomes.angles
+        snapshot, fitness = self._coordinator.evaluate(angles, self._maxVectorsCount)
+        won = snapshot.states == self.State.WON.value
+        if won.any():
+            best = int(snapshot.steps[won].min())
+            dead = snapshot.states == self.State.DEAD.value
+            late = np.flatnonzero((snapshot.steps > best) | (dead & (snapshot.steps >= best)))
+            if len(late) > 0:
+                lateSnapshot, lateFitness = self._coordinator.evaluate(angles[late], best)
+                fitness[late] = lateFitness
+                for values, lateValues in zip(snapshot, lateSnapshot):
+                    values[late] = lateValues
+            self._bestWinnerSteps = best
+        self._simulation.restore(snapshot, maxVectorsCount=self._bestWinnerSteps)
+        self._maxVectorsCount = self._simulation.maxVectorsCount
+        self._outcomeCounts = np.bincount(snapshot.states, minlength=len(self.State)).tolist()
+        self._fitness = fitness
+
+################################################################################
+
+def work(address):
+    """
+    Worker loop: connects to the coordinator at address and simulates the
+    batches it sends until it says stop or disconnects.
+    """
+
+    family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+    with socket.socket(family, socket.SOCK_STREAM) as connection:
+        connection.connect(address)
+        description, _ = receive(connection)
+        world = World.fromDescription(description)
+        wallIndex = WallIndex(world.walls)
+        if Evolution.DistanceBackend(description['distanceBackend']) is Evolution.DistanceBackend.FIELD:
+            goalDistance = DistanceField(world.goalPoint, wallIndex, world.allowedArea)
+        else:
+            goalDistance = GoalDistanceOracle(world.goalPoint, wallIndex, world.allowedArea)
+        while True:
+            try:
+                header, arrays = receive(connection)
+            except ConnectionError:
+                break
+            if header['type'] != 'batch':
+                break
+            simulation = Simulation(world.startPoint, world.goalPoint, world.goalTolerance, wallIndex,
+                                    arrays['angles'], header['maxVectorsCount'])
+            simulation.run()
+            results = simulation.snapshot()._asdict()
+            results['fitness'] = Evolution.evaluate(simulation, goalDistance)
+            send(connection, {'type': 'result'}, results)
+
+################################################################################
+
+def parseAddress(text):
+    """
+    'host:port' is a TCP address, anything else a Unix socket path.
+    """
+
+    host, separator, port = text.rpartition(':')
+    if separator and port.isdigit():
+        return host, int(port)
+    return text
+
+################################################################################
+
+# message: header length, JSON header, raw bytes of the arrays it describes
+_LENGTH = Struct('!I')
+
+################################################################################
+
+def send(connection, header, arrays=None):
+    """
+
+    """
+
+    arrays = {name: np.ascontiguousarray(values) for name, values in (arrays or {}).items()}
+    header = dict(header, arrays=[(name, values.dtype.str, values.shape) for name, values in arrays.items()])
+    data = json.dumps(header).encode()
+    connection.sendall(b''.join([_LENGTH.pack(len(data)), data]+[values.tobytes() for values in arrays.values()]))
+
+################################################################################
+
+def receive(connection):
+    """
+    Returns the header and a dictionary of the arrays of the next message.
+    """
+
+    data = _receiveExactly(connection, _LENGTH.unpack(_receiveExactly(connection, _LENGTH.size))[0])
+    header = json.loads(data)
+    arrays = {}
+    for name, dtype, shape in header.pop('arrays'):
+        dtype = np.dtype(dtype)
+        size = int(np.prod(shape))*dtype.itemsize
+        arrays[name] = np.frombuffer(_receiveExactly(connection, size), dtype).reshape(shape)
+    return header, arrays
+
+################################################################################
+
+def _receiveExactly(connection, size):
+    """
+
+    """
+
+    data = bytearray(size)
+    view = memoryview(data)
+    while view:
+        received = connection.recv_into(view)
+        if received == 0:
+            raise ConnectionError('connection closed')
+        view = view[received:]
+    return data
+
+################################################################################
@@ -0,0 +1,589 @@
+__author__ = 'Tofu Gang'
+
+import json
+import numpy as np
+import os
+from enum import Enum
+from collections import namedtuple
+from src.genome import Genomes
+from src.path_finding import GoalDistanceOracle, DynamicGoalDistanceOracle, DistanceField, WallIndex
+from src.simulation import Simulation
+from src.trajectory import Trajectories
+from src.world import World
+
+################################################################################
+
+class Evolution():
+    """
+    Qt-free genetic algorithm: one generation of genomes is simulated by the
+    batched engine, the next one is bred from it. The champion of the previous
+    generation is always the first dot of the new one.
+    """
+
+    POPULATION_SIZE = 100
+    VECTORS_COUNT = 400
+    State = Simulation.State
+    Counters = namedtuple('Counters', ['generation', 'won', 'exhausted', 'dead', 'maxVectorsCount', 'bestWinnerSteps',
+                                       'pruned', 'savedSteps'])
+
+    TOURNAMENT_SIZE = 3
+    SNAPSHOT_INTERVAL = Trajectories.INTERVAL
+    CHECKPOINT_VERSION = 1
+    # the generations are evaluated against walls that can't change, see
+    # _setWalls()
+    WALLS_FIXED = False
+
+    class DistanceBackend(Enum):
+        ORACLE = 'oracle'
+        FIELD = 'field'
+
+    class Selection(Enum):
+        ROULETTE = 'roulette'
+        STOCHASTIC_UNIVERSAL = 'sus'
+        TOURNAMENT = 'tournament'
+
+################################################################################
+
+    def __init__(self, world, populationSize=POPULATION_SIZE, distanceBackend=DistanceBackend.ORACLE,
+                 selection=Selection.ROULETTE, seed=None, snapshotInterval=SNAPSHOT_INTERVAL, pruning=False):
+        """
+        distanceBackend picks how the distance to the goal of the dots that
+        didn't win is measured: exactly by the visibility graph oracle or
+        approximately by a lookup into the rasterized distance field.
+        selection picks how the parents are drawn: fitness-proportionate one
+        by one (roulette), all at once by evenly spaced pointers (stochastic
+        universal sampling) or by tournaments of TOURNAMENT_SIZE dots.
+        Every snapshotInterval steps the motion of every dot is recorded so
+        that its children resume from it up to their first mutated gene; None
+        simulates every child from the start.
+        pruning exhausts early the dots that can't reach the goal any more
+        once someone has won. It is approximate: the winners, their fitness
+        and maxVectorsCount stay those of the full run, but the pruned dots
+        are scored where they stopped, not where they would have ended, so
+        the parents selected (and the generations that follow) may differ.
+        """
+
+        self._world = world
+        self._distanceBackend = distanceBackend
+        self._selection = selection
+        self._snapshotInterval = snapshotInterval
+        self._random = np.random.default_rng(seed)
+        self._wallIndex = WallIndex(world.walls)
+        if distanceBackend is self.DistanceBackend.FIELD:
+            self._goalDistance = DistanceField(world.goalPoint, self._wallIndex, world.allowedArea)
+        else:
+            self._goalDistance = GoalDistanceOracle(world.goalPoint, self._wallIndex, world.allowedArea)
+        # pruning needs exact lower bounds, which only the oracle gives
+        self._pruning = None
+        if pruning and distanceBackend is self.DistanceBackend.FIELD:
+            self._pruning = GoalDistanceOracle(world.goalPoint, self._wallIndex, world.allowedArea)
+        elif pruning:
+            self._pruning = self._goalDistance
+        # the walls changed during the current generation, see _setWalls()
+        self._wallsChanged = False
+        self._populationSize = populationSize
+        self._generationCount = 0
+        self._maxVectorsCount = self.VECTORS_COUNT
+        self._genomes = Genomes.random(self._populationSize, self.VECTORS_COUNT, self._random)
+        self._champion = None
+        # recording buffers reused across the generations, see _makeSimulation()
+        self._trajectories = [None, None]
+        self._trajectoriesIndex = 0
+        self._simulation = self._makeSimulation()
+
+################################################################################
+
+    @property
+    def world(self):
+        """
+
+        """
+
+        return self._world
+
+################################################################################
+
+    @property
+    def populationSize(self):
+        """
+
+        """
+
+        return self._populationSize
+
+################################################################################
+
+    @property
+    def generationCount(self):
+        """
+
+        """
+
+        return self._generationCount
+
+################################################################################
+
+    @property
+    def maxVectorsCount(self):
+        """
+
+        """
+
+        return self._maxVectorsCount
+
+################################################################################
+
+    @property
+    def simulation(self):
+        """
+
+        """
+
+        return self._simulation
+
+################################################################################
+
+    @property
+    def champion(self):
+        """
+        (fitness, genome angles) of the best dot of the last finished
+        generation; None before the first one finishes.
+        """
+
+        return self._champion
+
+################################################################################
+
+    @property
+    def genomes(self):
+        """
+
+        """
+
+        return self._genomes
+
+################################################################################
+
+    @property
+    def wonCount(self):
+        """
+
+        """
+
+        return self._outcomeCounts[self.State.WON.value]
+
+################################################################################
+
+    @property
+    def exhaustedCount(self):
+        """
+
+        """
+
+        return self._outcomeCounts[self.State.EXHAUSTED.value]
+
+################################################################################
+
+    @property
+    def deadCount(self):
+        """
+
+        """
+
+        return self._outcomeCounts[self.State.DEAD.value]
+
+################################################################################
+
+    @property
+    def counters(self):
+        """
+        Snapshot of the current generation's counters; bestWinnerSteps is None
+        until someone wins. The pruned dots are counted as exhausted too.
+        """
+
+        return self.Counters(self._generationCount,
+                             self.wonCount,
+                             self.exhaustedCount,
+                             self.deadCount,
+                             self._maxVectorsCount,
+                             self._bestWinnerSteps,
+                             self._simulation.prunedCount,
+                             self._simulation.savedSteps)
+
+################################################################################
+
+    def __getstate__(self):
+        """
+        Everything but the simulation of the current generation and the
+        trajectory buffers, they would make up most of a pickle (see Islands).
+        An unpickled evolution simulates the current generation again from
+        the start, with the same outcome.
+        """
+
+        state = self.__dict__.copy()
+        del state['_simulation']
+        state['_trajectories'] = [None, None]
+        return state
+
+################################################################################
+
+    def __setstate__(self, state):
+        """
+
+        """
+
+        self.__dict__.update(state)
+        self._simulation = self._makeSimulation()
+
+################################################################################
+
+    def __enter__(self):
+        """
+
+        """
+
+        return self
+
+################################################################################
+
+    def __exit__(self, *args):
+        """
+
+        """
+
+        self.close()
+
+################################################################################
+
+    def close(self):
+        """
+        Releases whatever the generations are evaluated with; nothing to do
+        in a single process.
+        """
+
+        pass
+
+################################################################################
+
+    def _makeSimulation(self):
+        """
+
+        """
+
+        # outcome counters are kept up to date by step() as the dots finish
+        self._startVectorsCount = self._maxVectorsCount
+        self._outcomeCounts = [0]*len(self.State)
+        self._bestWinnerSteps = None
+        self._fitness = None
+        trajectories = None
+        if self._snapshotInterval is not None:
+            # two buffers take turns, the previous generation's trajectories
+            # are read while the next one is being set up
+            self._trajectoriesIndex = 1-self._trajectoriesIndex
+            if self._trajectories[self._trajectoriesIndex] is None:
+                self._trajectories[self._trajectoriesIndex] = Trajectories(self._populationSize, self.VECTORS_COUNT,
+                                                                           self._snapshotInterval)
+            trajectories = self._trajectories[self._trajectoriesIndex]
+        return Simulation(self._world.startPoint,
+                          self._world.goalPoint,
+                          self._world.goalTolerance,
+                          self._wallIndex,
+                          self._genomes.angles,
+                          self._maxVectorsCount,
+                          trajectories,
+                          self._pruning)
+
+################################################################################
+
+    def step(self):
+        """
+        Advances the current generation by one tick; returns indices of the
+        dots that finished in it.
+        """
+
+        finished = self._simulation.step()
+        self._countFinished(finished)
+        return finished
+
+################################################################################
+
+    def _countFinished(self, finished):
+        """
+        Adds the dots that just finished to the outcome counters.
+        """
+
+        self._maxVectorsCount = self._simulation.maxVectorsCount
+        if len(finished) > 0:
+            states = self._simulation.states[finished]
+            for state, count in enumerate(np.bincount(states, minlength=len(self.State)).tolist()):
+                self._outcomeCounts[state] += count
+            won = finished[states == self.State.WON.value]
+            if len(won) > 0:
+                bestSteps = int(self._simulation.steps[won].min())
+                if self._bestWinnerSteps is None or bestSteps < self._bestWinnerSteps:
+                    self._bestWinnerSteps = bestSteps
+
+################################################################################
+
+    def runGeneration(self):
+        """
+        Simulates the rest of the current generation.
+        """
+
+        while not self._simulation.isFinished:
+            self.step()
+
+################################################################################
+
+    def fitness(self):
+        """
+        Fitness of every dot of the finished generation, evaluated once.
+        """
+
+        if self._fitness is None:
+            self._fitness = self.evaluate(self._simulation, self._goalDistance)
+        return self._fitness
+
+################################################################################
+
+    @classmethod
+    def evaluate(cls, simulation, goalDistance, out=None):
+        """
+        Fitness of every dot of a finished simulation: winners by their steps,
+        the others by their distance to the goal.
+        """
+
+        won = simulation.states == cls.State.WON.value
+        fitness = np.empty(len(won)) if out is None else out
+        fitness[won] = 1/16+10000/np.power(simulation.steps[won], 2.0)
+        with np.errstate(divide='ignore'):
+            fitness[~won] = 1/np.power(goalDistance.distances(simulation.positions[~won]), 2)
+        return fitness
+
+################################################################################
+
+    def nextGeneration(self):
+        """
+
+        """
+
+        # fitness is evaluated once per dot per generation
+        fitness = self.fitness()
+        self._generationCount += 1
+
+        # the champion goes first and unchanged, population size - 1 mutated children follow
+        champion = int(np.argmax(fitness))
+        self._champion = (float(fitness[champion]), self._genomes.angles[champion].copy())
+        parents = np.concatenate(([champion], self._selectParents(fitness, self._populationSize-1)))
+        self._genomes = self._genomes.children(parents, self._childrenBuffer())
+        firstMutations = np.concatenate(([self.VECTORS_COUNT], self._genomes.mutate(slice(1, None))))
+        previous = self._simulation
+        self._simulation = self._makeSimulation()
+        if self._snapshotInterval is not None and not self._wallsChanged:
+            self._resumeChildren(previous, parents, firstMutations)
+        self._wallsChanged = False
+
+################################################################################
+
+    def addWall(self, wall):
+        """
+        Adds a (left, top, right, bottom) custom wall to the map; see
+        _setWalls().
+        """
+
+        wall = tuple(float(value) for value in wall)
+        self._setWalls(self._world.wallsCustom+[wall], lambda oracle: oracle.addWall(wall))
+
+################################################################################
+
+    def removeWall(self, wall):
+        """
+        Removes a custom wall of the map; ValueError if there is no such wall.
+        See _setWalls().
+        """
+
+        wall = tuple(float(value) for value in wall)
+        wallsCustom = list(self._world.wallsCustom)
+        wallsCustom.remove(wall)
+        self._setWalls(wallsCustom, lambda oracle: oracle.removeWall(wall))
+
+################################################################################
+
+    def _setWalls(self, wallsCustom, change):
+        """
+        Moves the evolution to the map with other custom walls. The dots of
+        the running generation collide with the new walls from their next
+        tick on. The oracle distances to the goal (and the pruning bounds)
+        are repaired incrementally: the first change turns the oracle into a
+        DynamicGoalDistanceOracle of the old walls and applies change to it.
+        The distance field is built again. The children of a generation that
+        saw the walls change don't resume their parents' trajectories.
+        RuntimeError when the walls are fixed (WALLS_FIXED).
+        """
+
+        if self.WALLS_FIXED:
+            raise RuntimeError(type(self).__name__+' evaluates the generations against the walls it was started with')
+        oldWallIndex = self._wallIndex
+        world = self._world
+        self._world = World(world.allowedArea, world.startPoint, world.goalPoint, world.goalTolerance, wallsCustom,
+                            world.wallsSurrounding)
+        self._wallIndex = WallIndex(self._world.walls)
+
+        if self._distanceBackend is self.DistanceBackend.FIELD:
+            self._goalDistance = DistanceField(world.goalPoint, self._wallIndex, world.allowedArea)
+            if self._pruning is not None:
+                self._pruning = self._followWalls(self._pruning, oldWallIndex, change)
+        else:
+            self._goalDistance = self._followWalls(self._goalDistance, oldWallIndex, change)
+            if self._pruning is not None:
+                self._pruning = self._goalDistance
+        self._simulation.setWalls(self._wallIndex, self._pruning)
+        self._wallsChanged = True
+
+################################################################################
+
+    def _followWalls(self, oracle, oldWallIndex, change):
+        """
+        The dynamic counterpart of the oracle of the old walls, changed.
+        """
+
+        if not isinstance(oracle, DynamicGoalDistanceOracle):
+            oracle = DynamicGoalDistanceOracle(self._world.goalPoint, oldWallIndex, self._world.allowedArea)
+        change(oracle)
+        return oracle
+
+################################################################################
+
+    def _resumeChildren(self, previous, parents, firstMutations):
+        """
+        Every child follows its parent's trajectory up to its first mutated
+        gene, so it starts from the parent's recorded state there. A parent's
+        winning step is left to the child to simulate, so that the win is
+        detected in its tick.
+        """
+
+        won = previous.states[parents] == self.State.WON.value
+        steps = np.minimum(np.minimum(firstMutations, previous.steps[parents]-won), self._maxVectorsCount)
+        rows = np.flatnonzero(steps >= self._snapshotInterval)
+        # the children resumed at maxVectorsCount are exhausted right away
+        self._countFinished(self._simulation.resume(rows, previous.trajectories, parents[rows], steps[rows]))
+
+################################################################################
+
+    @classmethod
+    def fromCheckpoint(cls, path, world=None, **kwargs):
+        """
+        New evolution resumed from the checkpoint at path; the map stored in
+        it is used unless another world is given. kwargs go to the
+        constructor.
+        """
+
+        with np.load(path) as checkpoint:
+            header = json.loads(str(checkpoint['header']))
+        if world is None:
+            world = World.fromDescription(header['world'])
+        evolution = cls(world, header['populationSize'], cls.DistanceBackend(header['distanceBackend']),
+                        cls.Selection(header['selection']), **kwargs)
+        evolution.loadCheckpoint(path)
+        return evolution
+
+################################################################################
+
+    def saveCheckpoint(self, path):
+        """
+        Writes the state the current generation started from into an
+        uncompressed .npz file: a JSON header and the contiguous genome and
+        champion arrays. A generation in progress is simulated again on
+        resume. The file is replaced atomically.
+        """
+
+        header = {'version': self.CHECKPOINT_VERSION,
+                  'generationCount': self._generationCount,
+                  'maxVectorsCount': self._startVectorsCount,
+                  'populationSize': self._populationSize,
+                  'distanceBackend': self._distanceBackend.value,
+                  'selection': self._selection.value,
+                  'random': self._random.bit_generator.state,
+                  'world': self._world.description()}
+        if self._champion is None:
+            championFitness, championAngles = np.nan, np.empty(0, dtype=Genomes.DTYPE)
+        else:
+            championFitness, championAngles = self._champion
+        temporaryPath = path+'.'+str(os.getpid())+'.tmp'
+        with open(temporaryPath, 'wb') as file:
+            np.savez(file, header=np.array(json.dumps(header)), angles=self._genomes.angles,
+                     championFitness=np.float64(championFitness), championAngles=championAngles)
+        os.replace(temporaryPath, path)
+
+################################################################################
+
+    def loadCheckpoint(self, path):
+        """
+        Restores the state saved by saveCheckpoint(); the population size
+        must match. The current generation starts over.
+        """
+
+        with np.load(path) as checkpoint:
+            header = json.loads(str(checkpoint['header']))
+            if header['version'] != self.CHECKPOINT_VERSION:
+                raise ValueError('unsupported checkpoint version: '+str(header['version']))
+            angles = checkpoint['angles']
+            if angles.shape != self._genomes.angles.shape:
+                raise ValueError('checkpoint genomes of shape '+str(angles.shape)+' don\'t fit '+str(self._genomes.angles.shape))
+            # in place, the genomes may live in a preallocated buffer
+            self._genomes.angles[:] = angles
+            championFitness = float(checkpoint['championFitness'])
+            championAngles = checkpoint['championAngles']
+        self._generationCount = header['generationCount']
+        self._maxVectorsCount = header['maxVectorsCount']
+        self._random.bit_generator.state = header['random']
+        self._champion = None if np.isnan(championFitness) else (championFitness, championAngles)
+        self._simulation = self._makeSimulation()
+
+################################################################################
+
+    def _childrenBuffer(self):
+        """
+        Array the next generation's genomes are bred into; None allocates a
+        new one.
+        """
+
+        return None
+
+################################################################################
+
+    def immigrate(self, angles):
+        """
+        Replaces the last genomes of the generation that hasn't started yet by
+        the given ones; the champion in the first row stays.
+        """
+
+        angles = np.asarray(angles, dtype=Genomes.DTYPE).reshape(-1, self._genomes.angles.shape[1])[:self._populationSize-1]
+        if len(angles) > 0:
+            self._genomes.angles[-len(angles):] = angles
+            self._simulation = self._makeSimulation()
+
+################################################################################
+
+    def _selectParents(self, fitness, count):
+        """
+        Indices of count parents drawn in one batch.
+        """
+
+        total = fitness.sum()
+        if self._selection is self.Selection.TOURNAMENT:
+            contenders = self._random.integers(0, len(fitness), (count, self.TOURNAMENT_SIZE))
+            return contenders[np.arange(count), np.argmax(fitness[contenders], axis=1)]
+        elif total <= 0 or not np.isfinite(total):
+            return self._random.integers(0, len(fitness), count)
+        elif self._selection is self.Selection.STOCHASTIC_UNIVERSAL:
+            spacing = total/count
+            pointers = self._random.uniform(0, spacing)+spacing*np.arange(count)
+            draws = self._random.permutation(pointers)
+        else:
+            draws = self._random.uniform(0, total, count)
+        # the first dot whose partial fitness sum exceeds the draw
+        parents = np.searchsorted(np.cumsum(fitness), draws, side='right')
+        return np.minimum(parents, len(fitness)-1)
+
+################################################################################
@@ -0,0 +1,83 @@
+__author__ = 'Tofu Gang'
+
+import numpy as np
+from math import pi
+
+################################################################################
+
+class Genomes():
+    """
+    Genomes of the whole population as one contiguous (dots, genes) float32
+    array of vector angles; cloning and mutation work on all the rows at once.
+    """
+
+    MUTATION_RATE = 0.01
+    DTYPE = np.float32
+
+################################################################################
+
+    def __init__(self, angles, random):
+        """
+
+        """
+
+        self._angles = np.ascontiguousarray(angles, dtype=self.DTYPE)
+        self._random = random
+
+################################################################################
+
+    @classmethod
+    def random(cls, count, vectorsCount, random):
+        """
+        count genomes of random vectors.
+        """
+
+        return cls(random.uniform(0, 2*pi, (count, vectorsCount)), random)
+
+################################################################################
+
+    @property
+    def angles(self):
+        """
+
+        """
+
+        return self._angles
+
+################################################################################
+
+    def __len__(self):
+        """
+
+        """
+
+        return len(self._angles)
+
+################################################################################
+
+    def children(self, parents, out=None):
+        """
+        Clones of the genomes at the parents indices; out is an optional
+        preallocated array they are copied into.
+        """
+
+        if out is None:
+            return Genomes(self._angles[parents], self._random)
+        return Genomes(np.take(self._angles, parents, axis=0, out=out), self._random)
+
+################################################################################
+
+    def mutate(self, rows=slice(None)):
+        """
+        Replaces every gene of the rows by a random vector with the
+        probability of MUTATION_RATE. Returns the index of the first mutated
+        gene of every row, the genes count for the unchanged ones.
+        """
+
+        angles = self._angles[rows]
+        mutated = self._random.random(angles.shape) < self.MUTATION_RATE
+        angles[mutated] = self._random.uniform(-pi, pi, np.count_nonzero(mutated))
+        self._angles[rows] = angles
+        return np.where(mutated.any(axis=1), mutated.argmax(axis=1), angles.shape[1])
+
+################################################################################
@@ -0,0 +1,120 @@
+__author__ = 'Tofu Gang'
+
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from src.evolution import Evolution
+
+################################################################################
+
+class Islands():
+    """
+    Island model: ISLANDS_COUNT independent populations evolve in a process
+    pool. Every MIGRATION_INTERVAL generations the best MIGRANTS_COUNT genomes
+    of every island replace the last children of the next island (ring).
+    """
+
+    ISLANDS_COUNT = 4
+    MIGRATION_INTERVAL = 10
+    MIGRANTS_COUNT = 2
+
+################################################################################
+
+    def __init__(self, world, islandsCount=ISLANDS_COUNT, populationSize=Evolution.POPULATION_SIZE,
+                 migrationInterval=MIGRATION_INTERVAL, migrantsCount=MIGRANTS_COUNT, workers=None,
+                 distanceBackend=Evolution.DistanceBackend.ORACLE, selection=Evolution.Selection.ROULETTE, seed=None):
+        """
+        workers None means one per CPU core.
+        """
+
+        self._migrationInterval = migrationInterval
+        self._migrantsCount = migrantsCount
+        self._workers = workers
+        self._islands = [Evolution(world, populationSize, distanceBackend, selection, islandSeed)
+                         for islandSeed in np.random.SeedSequence(seed).spawn(islandsCount)]
+        self._champion = None
+
+################################################################################
+
+    @property
+    def islands(self):
+        """
+
+        """
+
+        return self._islands
+
+################################################################################
+
+    @property
+    def generationCount(self):
+        """
+
+        """
+
+        return self._islands[0].generationCount
+
+################################################################################
+
+    @property
+    def champion(self):
+        """
+        (fitness, genome angles, island index) of the best dot seen so far on
+        any island.
+        """
+
+        return self._champion
+
+################################################################################
+
+    def run(self, generations, report=None):
+        """
+        Evolves every island by generations; report(islands) is called after
+        every migration.
+        """
+
+        with ProcessPoolExecutor(self._workers) as executor:
+            while generations > 0:
+                epoch = min(generations, self._migrationInterval)
+                generations -= epoch
+                results = list(executor.map(_evolveIsland, self._islands, repeat(epoch), repeat(self._migrantsCount)))
+                self._islands = [island for island, _, _ in results]
+                for index, (_, champion, _) in enumerate(results):
+                    if champion is not None and (self._champion is None or champion[0] > self._champion[0]):
+                        self._champion = (champion[0], champion[1], index)
+                self._migrate([migrants for _, _, migrants in results])
+                if report is not None:
+                    report(self)
+
+################################################################################
+
+    def _migrate(self, migrants):
+        """
+
+        """
+
+        if len(self._islands) < 2:
+            return
+        for index, island in enumerate(self._islands):
+            island.immigrate(migrants[index-1])
+
+################################################################################
+
+def _evolveIsland(evolution, generations, migrantsCount):
+    """
+    Runs in a worker process: evolves one island and returns it together with
+    its best champion and the top genomes of its last generation.
+    """
+
+    champion = None
+    for generation in range(generations):
+        evolution.runGeneration()
+        if generation == generations-1:
+            best = np.argsort(evolution.fitness())[::-1][:migrantsCount]
+            migrants = evolution.genomes.angles[best].copy()
+        evolution.nextGeneration()
+        if champion is None or evolution.champion[0] > champion[0]:
+            champion = evolution.champion
+    return evolution, champion, migrants
+
+################################################################################
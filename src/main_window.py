@@ -11,11 +11,13 @@ class MainWindow(QMainWindow):
 
 ################################################################################
 
-    def __init__(self):
+    def __init__(self, populationSize=DataModel.POPULATION_SIZE, turbo=False, worlds=None):
         super().__init__()
         self.setFixedSize(self.WIDTH, self.HEIGHT)
-        model = DataModel()
+        model = DataModel(populationSize, turbo, worlds)
         view = QGraphicsView(model)
+        # the background is static, see DataModel.invalidateLayers()
+        view.setCacheMode(QGraphicsView.CacheBackground)
         self.setCentralWidget(view)
 
 ################################################################################
\ No newline at end of file
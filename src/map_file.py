@@ -0,0 +1,140 @@
+__author__ = 'Tofu Gang'
+
+import json
+import numpy as np
+import os
+from src.path_finding import GoalDistanceOracle, DistanceField, VisibilityGraph, WallIndex, preload
+from src.world import World
+
+################################################################################
+
+class MapFile():
+    """
+    A map stored as JSON in the format of World.description(). Compiling it
+    writes a binary sidecar next to it (same name, SIDECAR_EXTENSION) with
+    the wall arrays, the spatial index, both visibility graphs and the
+    distance field. Opening a map with an up-to-date sidecar preloads them,
+    so that building the walls index, the evolution or the scene of the map
+    computes nothing; a stale sidecar is ignored.
+    """
+
+    SIDECAR_EXTENSION = '.npz'
+    SIDECAR_VERSION = 1
+
+################################################################################
+
+    def __init__(self, path):
+        """
+
+        """
+
+        self._path = path
+        with open(path) as file:
+            self._world = World.fromDescription(json.load(file))
+        self._compiled = self._preload()
+
+################################################################################
+
+    @staticmethod
+    def save(world, path):
+        """
+        Writes the world as a map file.
+        """
+
+        with open(path, 'w') as file:
+            json.dump(world.description(), file, indent=4)
+
+################################################################################
+
+    @property
+    def path(self):
+        """
+
+        """
+
+        return self._path
+
+################################################################################
+
+    @property
+    def sidecarPath(self):
+        """
+
+        """
+
+        return os.path.splitext(self._path)[0]+self.SIDECAR_EXTENSION
+
+################################################################################
+
+    @property
+    def world(self):
+        """
+
+        """
+
+        return self._world
+
+################################################################################
+
+    @property
+    def compiled(self):
+        """
+        Whether an up-to-date sidecar was preloaded.
+        """
+
+        return self._compiled
+
+################################################################################
+
+    @property
+    def key(self):
+        """
+        Hash of the map's content.
+        """
+
+        return self._world.key
+
+################################################################################
+
+    def compile(self, resolution=DistanceField.RESOLUTION):
+        """
+        Builds everything precomputed of the map and writes the sidecar.
+        """
+
+        world = self._world
+        wallIndex = WallIndex(world.walls)
+        structures = [('wall_index', wallIndex),
+                      ('visibility_graph', VisibilityGraph(world.startPoint, world.goalPoint, wallIndex, world.allowedArea)),
+                      ('visibility_graph', GoalDistanceOracle(world.goalPoint, wallIndex, world.allowedArea).graph),
+                      ('distance_field', DistanceField(world.goalPoint, wallIndex, world.allowedArea, resolution))]
+        arrays = {'version': np.int64(self.SIDECAR_VERSION), 'map': np.array(self.key)}
+        for name, structure in structures:
+            for arrayName, values in structure.arrays.items():
+                arrays['/'.join((name, structure.key, arrayName))] = values
+        temporaryPath = self.sidecarPath+'.'+str(os.getpid())+'.tmp'+self.SIDECAR_EXTENSION
+        np.savez(temporaryPath, **arrays)
+        os.replace(temporaryPath, self.sidecarPath)
+        self._compiled = self._preload()
+
+################################################################################
+
+    def _preload(self):
+        """
+        Preloads the structures of an up-to-date sidecar; returns whether
+        there was one.
+        """
+
+        if not os.path.exists(self.sidecarPath):
+            return False
+        entries = {}
+        with np.load(self.sidecarPath) as arrays:
+            if int(arrays['version']) != self.SIDECAR_VERSION or str(arrays['map']) != self.key:
+                return False
+            for name in arrays.files:
+                if name.count('/') == 2:
+                    structure, key, arrayName = name.split('/')
+                    entries.setdefault((structure, key), {})[arrayName] = arrays[name]
+        preload(entries)
+        return True
+
+################################################################################
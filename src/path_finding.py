@@ -1,13 +1,23 @@
 __author__ = 'Tofu Gang'
 
-from PyQt5.QtCore import QPointF, QLineF
-from math import inf
+import numpy as np
+from math import inf, dist
 from enum import Enum
-from itertools import product
+from heapq import heappush, heappop
+from hashlib import sha1
+import os
+
+# where the precomputed map structures are cached, see _cached()
+CACHE_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache')
+# part of every cache key; to be raised whenever the cached arrays or the
+# algorithms computing them change, so that stale files are never loaded
+CACHE_VERSION = 1
 
 ################################################################################
 
 class PathFinding():
+    # segment-rectangle pairs intersectsBatch tests at once
+    BATCH_SIZE = 1 << 18
 
 ################################################################################
 
@@ -27,6 +37,8 @@ class PathFinding():
                VII  |    VI    |   V
         """
 
+        from PyQt5.QtCore import QPointF, QLineF
+
         if point.x() < rect.left():
             # region I, VIII, or VII
             if point.y() < rect.top():
@@ -71,6 +83,8 @@ class PathFinding():
 
         """
 
+        from PyQt5.QtCore import QPointF, QLineF
+
         keyLine = 'line'
         keyIntersection = 'intersection'
         rectLines = [{keyLine: QLineF(rect.topLeft(), rect.bottomLeft()),
@@ -105,52 +119,425 @@ class PathFinding():
         else:
             return True
 
+################################################################################
+
+    @staticmethod
+    def intersectsBatch(segments, rects, anyHit=False):
+        """
+        Qt-free, vectorized counterpart of intersects() with the same corner
+        and edge touching rules. Takes N (x1, y1, x2, y2) segments and M
+        (left, top, right, bottom) rectangles and returns the N×M hit matrix,
+        or with anyHit the per-segment flags telling whether a segment hits
+        any of the rectangles.
+        """
+
+        segments = np.asarray(segments, dtype=np.float64).reshape(-1, 4)
+        rects = np.asarray(rects, dtype=np.float64).reshape(-1, 4)
+        if anyHit:
+            hits = np.zeros(len(segments), dtype=bool)
+        else:
+            hits = np.zeros((len(segments), len(rects)), dtype=bool)
+        if len(segments) == 0 or len(rects) == 0:
+            return hits
+
+        # keep the temporary arrays of one batch reasonably small
+        batch = max(1, PathFinding.BATCH_SIZE//len(rects))
+        for first in range(0, len(segments), batch):
+            batchHits = PathFinding.intersectsPairs(segments[first:first+batch, np.newaxis, :], rects[np.newaxis, :, :])
+            hits[first:first+batch] = batchHits.any(axis=1) if anyHit else batchHits
+        return hits
+
+################################################################################
+
+    @staticmethod
+    def intersectsPairs(segments, rects):
+        """
+        Elementwise intersects() of (..., 4) segment and rectangle arrays that
+        broadcast together.
+        """
+
+        segments, rects = np.broadcast_arrays(np.asarray(segments, dtype=np.float64), np.asarray(rects, dtype=np.float64))
+        lineStart = segments[..., 0:2]
+        lineEnd = segments[..., 2:4]
+        left, top, right, bottom = (rects[..., i] for i in range(4))
+        topLeft = np.stack((left, top), axis=-1)
+        topRight = np.stack((right, top), axis=-1)
+        bottomLeft = np.stack((left, bottom), axis=-1)
+        bottomRight = np.stack((right, bottom), axis=-1)
+        # (side, ..., 2); left, right, top, bottom side
+        sideStarts = np.stack((topLeft, topRight, topLeft, bottomLeft))
+        sideEnds = np.stack((bottomLeft, bottomRight, topRight, bottomRight))
+
+        bounded, unbounded, points = _intersect(sideStarts, sideEnds, lineStart, lineEnd)
+        boundedCount = bounded.sum(axis=0)
+        unboundedCount = unbounded.sum(axis=0)
+        noIntersectionCount = 4-boundedCount-unboundedCount
+
+        # the first two sides with bounded intersection
+        first = np.argmax(bounded, axis=0)[np.newaxis]
+        second = (3-np.argmax(bounded[::-1], axis=0))[np.newaxis]
+        pick = lambda array, index: np.take_along_axis(array, index[..., np.newaxis], axis=0)[0]
+        firstPoint = pick(points, first)
+        secondPoint = pick(points, second)
+        sidesBounded, sidesUnbounded, _ = _intersect(pick(sideStarts, first), pick(sideEnds, first),
+                                                     pick(sideStarts, second), pick(sideEnds, second))
+        sidesParallel = ~(sidesBounded | sidesUnbounded)
+        corners = np.stack((topLeft, topRight, bottomLeft, bottomRight))
+        isCorner = lambda point: (_fuzzyEqual(point, corners).all(axis=-1)).any(axis=0)
+        samePoint = _fuzzyEqual(firstPoint, secondPoint).all(axis=-1)
+
+        # line is completely outside of the rectangle
+        miss = boundedCount == 0
+        # a rectangle side is part of the line
+        miss |= (boundedCount == 2) & sidesParallel & isCorner(firstPoint) & isCorner(secondPoint)
+        # one line end is a corner of the rectangle, second line end is completely outside of the rectangle;
+        # line angle with both intersecting rectangle sides is different from 90°
+        miss |= (boundedCount == 2) & samePoint
+        # one line end is a corner of the rectangle, second line end is completely outside of the rectangle;
+        # the line is perpendicular to the intersecting (bounded and unbounded) rectangle sides
+        miss |= (boundedCount == 1) & (unboundedCount == 1) & (noIntersectionCount == 2)
+        return ~miss
+
+################################################################################
+
+class WallIndex():
+    """
+    Uniform grid over the walls for the broad phase of collision checks. Every
+    cell keeps the walls its area touches (CSR arrays); a segment is tested
+    only against the walls of the cells its bounding box covers.
+    """
+
+    CELL_SIZE = 50
+
+################################################################################
+
+    def __init__(self, walls, cellSize=CELL_SIZE):
+        """
+
+        """
+
+        self._walls = np.asarray(walls, dtype=np.float64).reshape(-1, 4)
+        self._cellSize = cellSize
+        self._key = _key(self._walls, cellSize)
+        # only a preloaded index (see preload()) is taken over, building one is cheap
+        self._arrays = _cached(None, 'wall_index', self._key, self._build)
+        self._origin = self._arrays['origin']
+        self._columns, self._rows = self._arrays['shape'].tolist()
+        self._cellWalls = self._arrays['cellWalls']
+        self._cellStarts = self._arrays['cellStarts']
+
+################################################################################
+
+    def _build(self):
+        """
+
+        """
+
+        if len(self._walls) > 0:
+            self._origin = self._walls[:, 0:2].min(axis=0)
+            extent = self._walls[:, 2:4].max(axis=0)-self._origin
+        else:
+            self._origin = np.zeros(2)
+            extent = np.zeros(2)
+        self._columns, self._rows = (np.floor(extent/self._cellSize).astype(np.int64)+1).tolist()
+
+        wallIndices = np.arange(len(self._walls))
+        wallCells, wallIndices = self._cellsCovered(self._walls[:, 0:2], self._walls[:, 2:4], wallIndices)
+        order = np.argsort(wallCells, kind='stable')
+        return {'origin': self._origin,
+                'shape': np.array([self._columns, self._rows], dtype=np.int64),
+                'cellWalls': wallIndices[order],
+                'cellStarts': np.searchsorted(wallCells[order], np.arange(self._columns*self._rows+1))}
+
+################################################################################
+
+    @property
+    def key(self):
+        """
+        Hash of the walls and the cell size.
+        """
+
+        return self._key
+
+################################################################################
+
+    @property
+    def arrays(self):
+        """
+        Dictionary of the index arrays, as stored by a cache.
+        """
+
+        return self._arrays
+
+################################################################################
+
+    @staticmethod
+    def of(walls):
+        """
+        The walls themselves when they already are an index, a new index of
+        them otherwise.
+        """
+
+        if isinstance(walls, WallIndex):
+            return walls
+        return WallIndex(walls)
+
+################################################################################
+
+    @property
+    def walls(self):
+        """
+
+        """
+
+        return self._walls
+
+################################################################################
+
+    def _cellsCovered(self, minimums, maximums, owners):
+        """
+        Enumerates the cells of the boxes given by their minimum and maximum
+        corners; returns (cells, owners) pairs.
+        """
+
+        first = np.floor((minimums-self._origin)/self._cellSize).astype(np.int64)
+        last = np.floor((maximums-self._origin)/self._cellSize).astype(np.int64)
+        limits = np.array([self._columns-1, self._rows-1])
+        first = np.clip(first, 0, limits)
+        last = np.clip(last, 0, limits)
+        widths = last[:, 0]-first[:, 0]+1
+        counts = widths*(last[:, 1]-first[:, 1]+1)
+        box = np.repeat(np.arange(len(counts)), counts)
+        local = np.arange(counts.sum())-np.repeat(np.cumsum(counts)-counts, counts)
+        columns = first[box, 0]+local%widths[box]
+        rows = first[box, 1]+local//widths[box]
+        return rows*self._columns+columns, owners[box]
+
+################################################################################
+
+    def candidatePairs(self, segments):
+        """
+        (segment index, wall index) pairs whose cells overlap, each pair once.
+        """
+
+        segments = np.asarray(segments, dtype=np.float64).reshape(-1, 4)
+        if len(segments) == 0 or len(self._walls) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        minimums = np.minimum(segments[:, 0:2], segments[:, 2:4])
+        maximums = np.maximum(segments[:, 0:2], segments[:, 2:4])
+        cells, segmentIndices = self._cellsCovered(minimums, maximums, np.arange(len(segments)))
+        wallCounts = self._cellStarts[cells+1]-self._cellStarts[cells]
+        segmentIndices = np.repeat(segmentIndices, wallCounts)
+        offsets = np.arange(wallCounts.sum())-np.repeat(np.cumsum(wallCounts)-wallCounts, wallCounts)
+        wallIndices = self._cellWalls[np.repeat(self._cellStarts[cells], wallCounts)+offsets]
+        pairs = np.unique(segmentIndices*len(self._walls)+wallIndices)
+        return pairs//len(self._walls), pairs%len(self._walls)
+
+################################################################################
+
+    def candidates(self, segment):
+        """
+        Indices of the walls the segment may touch.
+        """
+
+        return self.candidatePairs([segment])[1]
+
+################################################################################
+
+    def intersectsAny(self, segments):
+        """
+        Same as PathFinding.intersectsBatch(segments, walls, anyHit=True), but
+        only the candidate pairs get the exact test.
+        """
+
+        segments = np.asarray(segments, dtype=np.float64).reshape(-1, 4)
+        hits = np.zeros(len(segments), dtype=bool)
+        segmentIndices, wallIndices = self.candidatePairs(segments)
+        for first in range(0, len(segmentIndices), PathFinding.BATCH_SIZE):
+            batchSegments = segmentIndices[first:first+PathFinding.BATCH_SIZE]
+            batchWalls = wallIndices[first:first+PathFinding.BATCH_SIZE]
+            batchHits = PathFinding.intersectsPairs(segments[batchSegments], self._walls[batchWalls])
+            hits[batchSegments[batchHits]] = True
+        return hits
+
 ################################################################################
 
 class VisibilityGraph():
+    """
+    Visibility graph of the start, the goal and the wall corners. Vertices are
+    integer ids (the start is 0, the goal is the last one), the adjacency is
+    kept in compact CSR arrays and the shortest paths from the start are found
+    by a heap based Dijkstra or, when only the route to the goal is needed, by
+    A* with the Euclidean heuristic.
+    """
 
     class VertexType(Enum):
         START = 0
         INSIDE = 1
         END = 2
 
+    class Search(Enum):
+        DIJKSTRA = 0
+        A_STAR = 1
+
+    class Builder(Enum):
+        # every pair of vertices gets the exact test
+        PAIRS = 0
+        # a rotational sweep around every vertex drops the pairs hidden
+        # behind a wall first, only the rest gets the exact test
+        SWEEP = 1
+
+    # angular (radians) and distance margins of the sweep's shadows
+    SWEEP_ANGLE_MARGIN = 1e-9
+    SWEEP_DISTANCE_MARGIN = 1e-6
+
 ################################################################################
 
-    def __init__(self, startPoint, goalPoint, walls, allowedArea):
+    def __init__(self, startPoint, goalPoint, walls, allowedArea, search=Search.DIJKSTRA, builder=Builder.SWEEP,
+                 reduced=False, cacheDirectory=CACHE_DIRECTORY):
         """
+        Points are (x, y) tuples, walls (or their WallIndex) and the allowed
+        area are (left, top, right, bottom) rectangles. goalPoint may be None; the search then
+        spreads distances from the start to every vertex. Distances of the
+        vertices A* doesn't settle stay upper bounds. Both builders give the
+        same edges; the sweep scales to maps with thousands of corners.
+
+        A reduced graph keeps only the corners a shortest path can bend
+        around and the edges tangent to the walls at both ends; the routes
+        from the start stay the same.
 
+        The graph and its search are loaded from cacheDirectory when the same
+        one was built before; None disables the disk cache.
         """
 
-        self._graph = []
-        self._keyPoint = 'point'
-        self._keyEdgesTo = 'edges_to'
-        self._keyDistance = 'distance'
-        self._keyPointPrevious = 'point_previous'
-        self._keyVisited = 'visited'
-        self._keyVertexType = 'vertex_type'
+        self._points = []
+        self._vertexTypes = []
+        # per vertex, the (x, y) signs of the only quadrant around it the
+        # walls cover; (0, 0) for the start, the goal and the full graph
+        self._quadrants = None
+        self._edges = None
+        self._routeEdges = None
 
-        self._makeVertices(startPoint, walls, goalPoint, allowedArea)
-        self._makeEdges(walls)
-        self._dijkstra()
+        self._key = _key(startPoint, np.nan if goalPoint is None else goalPoint, WallIndex.of(walls).walls, allowedArea,
+                         search.value, reduced)
+        self._arrays = _cached(cacheDirectory, 'visibility_graph', self._key,
+                               lambda: self._build(startPoint, goalPoint, walls, allowedArea, search, builder, reduced))
+        self._load(self._arrays)
 
 ################################################################################
 
     @property
-    def edges(self):
+    def key(self):
+        """
+        Hash of everything the graph depends on.
+        """
+
+        return self._key
+
+################################################################################
+
+    @property
+    def arrays(self):
+        """
+        Dictionary of the graph and search arrays, as stored by a cache.
+        """
+
+        return self._arrays
+
+################################################################################
+
+    def _build(self, startPoint, goalPoint, walls, allowedArea, search, builder, reduced):
+        """
+        Arrays of the built and searched graph, see _load().
+        """
+
+        self._makeVertices(startPoint, walls, goalPoint, allowedArea, reduced)
+        self._makeEdges(walls, builder)
+        if search is self.Search.A_STAR and self._goal is not None:
+            self._aStar()
+        else:
+            self._dijkstra()
+        return {'points': np.array(self._points, dtype=np.float64).reshape(-1, 2),
+                'vertexTypes': np.array([vertexType.value for vertexType in self._vertexTypes], dtype=np.int64),
+                'goal': np.int64(-1 if self._goal is None else self._goal),
+                'quadrants': self._quadrants,
+                'neighbourStarts': self._neighbourStarts,
+                'neighbours': self._neighbours,
+                'weights': self._weights,
+                'distances': np.array(self._distances, dtype=np.float64),
+                'previous': np.array(self._previous, dtype=np.int64)}
+
+################################################################################
+
+    def _load(self, arrays):
+        """
+
+        """
+
+        self._points = [tuple(point) for point in arrays['points'].tolist()]
+        self._vertexTypes = [self.VertexType(value) for value in arrays['vertexTypes'].tolist()]
+        goal = int(arrays['goal'])
+        self._goal = None if goal < 0 else goal
+        self._quadrants = arrays['quadrants']
+        self._neighbourStarts = arrays['neighbourStarts']
+        self._neighbours = arrays['neighbours']
+        self._weights = arrays['weights']
+        self._distances = arrays['distances'].tolist()
+        self._previous = arrays['previous'].tolist()
+
+################################################################################
+
+    @property
+    def points(self):
+        """
+        (x, y) of every vertex id.
+        """
+
+        return self._points
+
+################################################################################
+
+    @property
+    def vertexTypes(self):
+        """
+
+        """
+
+        return self._vertexTypes
+
+################################################################################
+
+    @property
+    def distances(self):
+        """
+        Distance from the start of every vertex id.
+        """
+
+        return self._distances
+
+################################################################################
+
+    def neighbours(self, vertex):
+        """
+
         """
 
+        return self._neighbours[self._neighbourStarts[vertex]:self._neighbourStarts[vertex+1]]
+
+################################################################################
+
+    @property
+    def edges(self):
+        """
+        ((x1, y1), (x2, y2)) of every undirected edge; built once.
         """
 
-        edges = []
-        for graphEntry in self._graph:
-            point = graphEntry[self._keyPoint]
-            neighbours = graphEntry[self._keyEdgesTo]
-            for neighbour in neighbours:
-                edge = QLineF(point, neighbour)
-                edgeRev = QLineF(neighbour, point)
-                if edgeRev not in edges:
-                    edges.append(edge)
-        return edges
+        if self._edges is None:
+            sources = np.repeat(np.arange(len(self._points)), np.diff(self._neighbourStarts))
+            once = sources < self._neighbours
+            self._edges = [(self._points[vertex], self._points[neighbour])
+                           for vertex, neighbour in zip(sources[once].tolist(), self._neighbours[once].tolist())]
+        return self._edges
 
 ################################################################################
 
@@ -160,7 +547,9 @@ class VisibilityGraph():
 
         """
 
-        return sum(edge.length() for edge in self.shortestRouteEdges)
+        if self._goal is None:
+            return inf
+        return self._distances[self._goal]
 
 ################################################################################
 
@@ -170,99 +559,248 @@ class VisibilityGraph():
 
         """
 
-        edges = []
-        endEntry = sorted([graphEntry for graphEntry in self._graph if graphEntry[self._keyVertexType] == self.VertexType.END], key=lambda graphEntry: graphEntry[self._keyDistance])[0]
-        graphEntry = endEntry
-        while graphEntry[self._keyDistance] != 0:
-            point = graphEntry[self._keyPoint]
-            pointPrevious = graphEntry[self._keyPointPrevious]
-            edges.append(QLineF(point, pointPrevious))
-            graphEntry = self._graphEntry(pointPrevious)
-        return edges
+        if self._routeEdges is None:
+            self._routeEdges = []
+            if self._goal is not None and self._distances[self._goal] < inf:
+                vertex = self._goal
+                while self._previous[vertex] >= 0:
+                    self._routeEdges.append((self._points[vertex], self._points[self._previous[vertex]]))
+                    vertex = self._previous[vertex]
+        return self._routeEdges
 
 ################################################################################
 
-    def _makeVertices(self, startPoint, walls, goalPoint, allowedArea):
+    def _makeVertices(self, startPoint, walls, goalPoint, allowedArea, reduced):
         """
 
         """
 
+        wallIndex = WallIndex.of(walls)
+        walls = [tuple(wall) for wall in wallIndex.walls.tolist()]
+
         # fill the graph with the starting point and all wall corners
-        self._graph.append({self._keyPoint: startPoint,
-                            self._keyEdgesTo: [],
-                            self._keyDistance: 0,
-                            self._keyPointPrevious: None,
-                            self._keyVisited: False,
-                            self._keyVertexType: self.VertexType.START})
-        wallCorners = [wall.topLeft() for wall in walls] \
-                     +[wall.topRight() for wall in walls] \
-                     +[wall.bottomLeft() for wall in walls] \
-                     +[wall.bottomRight() for wall in walls]
-        wallCorners = [corner for corner in wallCorners if allowedArea.contains(corner)]
-        for wallCorner in wallCorners:
-            self._graph.append({self._keyPoint: wallCorner,
-                                self._keyEdgesTo: [],
-                                self._keyDistance: inf,
-                                self._keyPointPrevious: None,
-                                self._keyVisited: False,
-                                self._keyVertexType: self.VertexType.INSIDE})
+        self._points.append(tuple(startPoint))
+        self._vertexTypes.append(self.VertexType.START)
+        wallCorners, _ = self._corners(walls, allowedArea)
+        quadrants = np.zeros((len(wallCorners), 2), dtype=np.int64)
+        if reduced:
+            wallCorners, quadrants = self._convexCorners(wallCorners, wallIndex)
+        self._points += wallCorners
+        self._vertexTypes += [self.VertexType.INSIDE]*len(wallCorners)
 
-        # add the goal point
-        self._graph.append({self._keyPoint: goalPoint,
-                            self._keyEdgesTo: [],
-                            self._keyDistance: inf,
-                            self._keyPointPrevious: None,
-                            self._keyVisited: False,
-                            self._keyVertexType: self.VertexType.END})
+        # add the goal point; a graph without one just spreads distances from the start
+        self._goal = None
+        if goalPoint is not None:
+            self._goal = len(self._points)
+            self._points.append(tuple(goalPoint))
+            self._vertexTypes.append(self.VertexType.END)
+        self._quadrants = np.zeros((len(self._points), 2), dtype=np.int64)
+        self._quadrants[1:1+len(wallCorners)] = quadrants
 
 ################################################################################
 
-    def _makeEdges(self, walls):
+    @staticmethod
+    def _corners(walls, allowedArea):
+        """
+        Corners of the walls that lie in the allowed area, all top left ones
+        first, then the top right, bottom left and bottom right ones; returns
+        them with the indices of the walls they belong to.
         """
 
+        corners = [((left, top), index) for index, (left, top, right, bottom) in enumerate(walls)] \
+                 +[((right, top), index) for index, (left, top, right, bottom) in enumerate(walls)] \
+                 +[((left, bottom), index) for index, (left, top, right, bottom) in enumerate(walls)] \
+                 +[((right, bottom), index) for index, (left, top, right, bottom) in enumerate(walls)]
+        areaLeft, areaTop, areaRight, areaBottom = allowedArea
+        corners = [((x, y), index) for (x, y), index in corners if areaLeft <= x <= areaRight and areaTop <= y <= areaBottom]
+        return [corner for corner, _ in corners], [index for _, index in corners]
+
+################################################################################
+
+    @staticmethod
+    def _convexCorners(corners, wallIndex):
+        """
+        The distinct corners a shortest path can bend around, with the signs
+        of the quadrant the walls cover around each. A corner where the walls
+        cover one quadrant is convex; two adjacent ones make a straight side,
+        three a concave corner and four the inside of the walls, none of
+        which a shortest path touches. Corners of walls without an interior
+        (no quadrant) and pinches between two walls (opposite quadrants) are
+        kept with no quadrant, every edge counts as tangent there.
         """
 
-        for pair in product(self._graph, repeat=2):
-            graphEntry1 = pair[0]
-            graphEntry2 = pair[1]
-            if graphEntry1 is not graphEntry2:
-                point1 = graphEntry1[self._keyPoint]
-                point2 = graphEntry2[self._keyPoint]
-                edge = QLineF(point1, point2)
-                for wall in walls:
-                    if PathFinding.intersects(wall, edge):
-                        break
-                else:
-                    if not point2 in graphEntry1[self._keyEdgesTo]:
-                        graphEntry1[self._keyEdgesTo].append(point2)
-                    if not point1 in graphEntry2[self._keyEdgesTo]:
-                        graphEntry2[self._keyEdgesTo].append(point1)
+        points = np.array(corners, dtype=np.float64).reshape(-1, 2)
+        _, first = np.unique(points, axis=0, return_index=True)
+        points = points[np.sort(first)]
+        signs = np.array([(1, 1), (-1, 1), (1, -1), (-1, -1)])
+        covered = np.zeros((len(points), len(signs)), dtype=bool)
+        cornerIndices, wallIndices = wallIndex.candidatePairs(np.hstack((points, points)))
+        x, y = points[cornerIndices].T
+        left, top, right, bottom = wallIndex.walls[wallIndices].T
+        for quadrant, (signX, signY) in enumerate(signs):
+            inX = (left <= x) & (x < right) if signX > 0 else (left < x) & (x <= right)
+            inY = (top <= y) & (y < bottom) if signY > 0 else (top < y) & (y <= bottom)
+            covered[cornerIndices[inX & inY], quadrant] = True
+        counts = covered.sum(axis=1)
+        # opposite quadrants: (1, 1) with (-1, -1) or (-1, 1) with (1, -1)
+        pinch = (counts == 2) & ((covered[:, 0] & covered[:, 3]) | (covered[:, 1] & covered[:, 2]))
+        keep = (counts <= 1) | pinch
+        quadrants = np.where((counts == 1)[:, np.newaxis], signs[np.argmax(covered, axis=1)], 0)
+        return [tuple(point) for point in points[keep].tolist()], quadrants[keep]
 
 ################################################################################
 
-    def _minDistanceUnvisited(self):
+    def _makeEdges(self, walls, builder):
+        """
+        Two vertices are connected when either direction of the segment
+        between them is free; all the candidate pairs are tested in one
+        batch.
         """
 
+        points = np.array(self._points, dtype=np.float64).reshape(-1, 2)
+        wallIndex = WallIndex.of(walls)
+        if builder is self.Builder.SWEEP:
+            vertices1, vertices2 = self._sweep(points, wallIndex.walls)
+        else:
+            vertices1, vertices2 = np.triu_indices(len(points), 1)
+        # a line through a convex corner is tangent to the walls there unless
+        # it runs into their quadrant, which is the same for both directions;
+        # the edges of the start and the goal stay, they may lie in the walls
+        vectors = points[vertices2]-points[vertices1]
+        tangent = (self._quadrants[vertices1].prod(axis=1)*vectors.prod(axis=1) <= 0) \
+                 &(self._quadrants[vertices2].prod(axis=1)*vectors.prod(axis=1) <= 0)
+        tangent |= (vertices1 == 0) | (vertices2 == self._goal)
+        vertices1, vertices2 = vertices1[tangent], vertices2[tangent]
+        forward = np.hstack((points[vertices1], points[vertices2]))
+        backward = np.hstack((points[vertices2], points[vertices1]))
+        free = ~(wallIndex.intersectsAny(forward) & wallIndex.intersectsAny(backward))
+        self._setAdjacency(vertices1[free], vertices2[free])
+
+################################################################################
+
+    def _sweep(self, points, walls):
+        """
+        Candidate pairs (i < j) of the vertices that may see each other: the
+        pairs hidden behind a wall from either end (see _hidden()) are
+        dropped. What the margins leave undecided (corners on other walls,
+        grazing segments) stays a candidate.
         """
 
-        distanceMin = inf
-        graphEntryMin = None
-        for graphEntry in self._graph:
-            distance = graphEntry[self._keyDistance]
-            visited = graphEntry[self._keyVisited]
-            if not visited and distance < distanceMin:
-                distanceMin = distance
-                graphEntryMin = graphEntry
-        return graphEntryMin
+        count = len(points)
+        visible = np.ones((count, count), dtype=bool)
+        # walls without an interior don't hide anything for sure
+        walls = walls[(walls[:, 2] > walls[:, 0]) & (walls[:, 3] > walls[:, 1])]
+        if count < 2 or len(walls) == 0:
+            return np.triu_indices(count, 1)
+        for vertex, point in enumerate(points):
+            visible[vertex] = ~self._hidden(point, points, walls)
+        visible &= visible.T
+        return np.nonzero(np.triu(visible, 1))
 
 ################################################################################
 
-    def _graphEntry(self, point):
+    @classmethod
+    def _hidden(cls, point, targets, walls):
         """
+        Flags of the targets the point surely doesn't see, in O((T+W) log T).
 
+        The targets are visited in the angular order around the point. A wall
+        (with an interior) the point lies strictly outside of casts a shadow:
+        the open angular interval between its outermost corners, beyond its
+        farthest corner. Every target in there is behind the wall's interior,
+        so the segment to it hits the wall in both directions. The shadows are
+        ranges of the angular order; a segment tree over it keeps the nearest
+        shadow depth of every range.
         """
 
-        return [graphEntry for graphEntry in self._graph if graphEntry[self._keyPoint] == point][0]
+        count = len(targets)
+        hidden = np.zeros(count, dtype=bool)
+        angleMargin = cls.SWEEP_ANGLE_MARGIN
+        distanceMargin = cls.SWEEP_DISTANCE_MARGIN
+        if count == 0:
+            return hidden
+        # walls off the box of the point and the targets hide none of them
+        minimum = np.minimum(targets.min(axis=0), point)
+        maximum = np.maximum(targets.max(axis=0), point)
+        walls = walls[(walls[:, 0] < maximum[0]) & (walls[:, 2] > minimum[0])
+                     &(walls[:, 1] < maximum[1]) & (walls[:, 3] > minimum[1])]
+        outside = (point[0] < walls[:, 0]-distanceMargin) | (point[0] > walls[:, 2]+distanceMargin) \
+                 |(point[1] < walls[:, 1]-distanceMargin) | (point[1] > walls[:, 3]+distanceMargin)
+        if not outside.any():
+            return hidden
+        walls = walls[outside]
+        offsets = np.stack((walls[:, [0, 1]], walls[:, [2, 1]], walls[:, [0, 3]], walls[:, [2, 3]]), axis=1)-point
+        centreAngles = np.arctan2(*((walls[:, 0:2]+walls[:, 2:4])/2-point)[:, ::-1].T)
+        # corner angles relative to the centre's, the wall spans less than pi
+        spans = np.arctan2(*offsets[..., ::-1].transpose(2, 0, 1))-centreAngles[:, np.newaxis]
+        spans = (spans+np.pi)%(2*np.pi)-np.pi
+        starts = centreAngles+spans.min(axis=1)+angleMargin
+        stops = centreAngles+spans.max(axis=1)-angleMargin
+        depths = np.hypot(offsets[..., 0], offsets[..., 1]).max(axis=1)+distanceMargin
+
+        # three turns of the angular order, so that no interval wraps
+        vectors = targets-point
+        angles = np.arctan2(vectors[:, 1], vectors[:, 0])
+        order = np.argsort(angles, kind='stable')
+        angles = angles[order]
+        turns = np.concatenate((angles-2*np.pi, angles, angles+2*np.pi))
+        first = np.searchsorted(turns, starts, 'right')
+        last = np.searchsorted(turns, stops, 'left')
+        nearest = _rangeMinimum(len(turns), first, last, depths).reshape(3, count).min(axis=0)
+        hidden[order[np.hypot(vectors[order, 0], vectors[order, 1]) > nearest]] = True
+        return hidden
+
+################################################################################
+
+    def _setAdjacency(self, vertices1, vertices2):
+        """
+        Packs undirected edges into the CSR arrays.
+        """
+
+        sources = np.concatenate((vertices1, vertices2)).astype(np.int64)
+        targets = np.concatenate((vertices2, vertices1)).astype(np.int64)
+        order = np.lexsort((targets, sources))
+        sources = sources[order]
+        self._neighbours = targets[order]
+        self._neighbourStarts = np.searchsorted(sources, np.arange(len(self._points)+1))
+        points = np.array(self._points, dtype=np.float64).reshape(-1, 2)
+        self._weights = np.hypot(*(points[self._neighbours]-points[sources]).T)
+
+################################################################################
+
+    def _search(self, heuristic=None):
+        """
+        Heap based best-first search from the start; with a heuristic it stops
+        as soon as the goal is settled.
+        """
+
+        stopAtGoal = heuristic is not None
+        if heuristic is None:
+            heuristic = lambda vertex: 0
+
+        neighbourStarts = self._neighbourStarts.tolist()
+        neighbours = self._neighbours.tolist()
+        weights = self._weights.tolist()
+        self._distances = [inf]*len(self._points)
+        self._previous = [-1]*len(self._points)
+        visited = [False]*len(self._points)
+        self._distances[0] = 0
+        heap = [(heuristic(0), 0)]
+        while heap:
+            _, vertex = heappop(heap)
+            if visited[vertex]:
+                continue
+            visited[vertex] = True
+            if stopAtGoal and vertex == self._goal:
+                break
+            distance = self._distances[vertex]
+            for i in range(neighbourStarts[vertex], neighbourStarts[vertex+1]):
+                neighbour = neighbours[i]
+                distanceNext = distance+weights[i]
+                if not visited[neighbour] and distanceNext < self._distances[neighbour]:
+                    self._distances[neighbour] = distanceNext
+                    self._previous[neighbour] = vertex
+                    heappush(heap, (distanceNext+heuristic(neighbour), neighbour))
 
 ################################################################################
 
@@ -271,21 +809,882 @@ class VisibilityGraph():
 
         """
 
-        minDistGraphEntry = self._minDistanceUnvisited()
-        while minDistGraphEntry is not None:
-            point = minDistGraphEntry[self._keyPoint]
-            neighbours = minDistGraphEntry[self._keyEdgesTo]
-            for neighbour in neighbours:
-                neighbourEntry = self._graphEntry(neighbour)
-                neighbourVisited = neighbourEntry[self._keyVisited]
-                if not neighbourVisited:
-                    distanceCurrent = minDistGraphEntry[self._keyDistance]
-                    distanceNext = distanceCurrent+QLineF(point, neighbour).length()
-                    distanceNextCurrent = neighbourEntry[self._keyDistance]
-                    if distanceNext < distanceNextCurrent:
-                        neighbourEntry[self._keyDistance] = distanceNext
-                        neighbourEntry[self._keyPointPrevious] = point
-            minDistGraphEntry[self._keyVisited] = True
-            minDistGraphEntry = self._minDistanceUnvisited()
+        self._search()
+
+################################################################################
+
+    def _aStar(self):
+        """
+
+        """
+
+        goalPoint = self._points[self._goal]
+        self._search(lambda vertex: dist(self._points[vertex], goalPoint))
+
+################################################################################
+
+class DynamicVisibilityGraph():
+    """
+    Full visibility graph (see VisibilityGraph) of walls that are added and
+    removed one at a time. A change tests again only the vertex pairs whose
+    segment crosses the changed wall and the pairs of a new wall's corners;
+    the distances from the start are then repaired by LPA* with a zero
+    heuristic, which visits only the vertices whose distance changed. Every
+    vertex's distance is kept, there is no goal to aim a heuristic at.
+
+    Vertex ids are stable: the graph starts with the ids of VisibilityGraph
+    (the start is 0) and the corners of added walls get new ones; the ids of
+    removed corners are not reused.
+    """
+
+    # margin of the box test picking the pairs a changed wall may affect
+    MARGIN = 1e-6
+
+################################################################################
+
+    def __init__(self, startPoint, goalPoint, walls, allowedArea, cacheDirectory=CACHE_DIRECTORY):
+        """
+        Same arguments as VisibilityGraph; the initial graph is built (or
+        loaded from cacheDirectory) by it.
+        """
+
+        wallIndex = WallIndex.of(walls)
+        graph = VisibilityGraph(startPoint, goalPoint, wallIndex, allowedArea, cacheDirectory=cacheDirectory)
+        arrays = graph.arrays
+        self._allowedArea = tuple(float(value) for value in allowedArea)
+        self._wallIndex = wallIndex
+        self._walls = dict(enumerate(tuple(wall) for wall in wallIndex.walls.tolist()))
+        self._nextWall = len(self._walls)
+
+        # vertex id -> (x, y), wall id of the corners; coordinates by vertex id
+        # for the batched tests, the rows of removed vertices stay unused
+        self._points = dict(enumerate(graph.points))
+        _, owners = VisibilityGraph._corners(list(self._walls.values()), self._allowedArea)
+        self._owners = dict(zip(range(1, len(owners)+1), owners))
+        self._coordinates = arrays['points'].copy()
+        self._goal = None if goalPoint is None else int(arrays['goal'])
+        self._nextVertex = len(self._points)
+
+        # vertex id -> {neighbour id: weight}
+        neighbourStarts = arrays['neighbourStarts'].tolist()
+        neighbours = arrays['neighbours'].tolist()
+        weights = arrays['weights'].tolist()
+        self._adjacency = {vertex: dict(zip(neighbours[neighbourStarts[vertex]:neighbourStarts[vertex+1]],
+                                            weights[neighbourStarts[vertex]:neighbourStarts[vertex+1]]))
+                           for vertex in self._points}
+
+        # LPA* state: the distances (g), their one-step lookaheads (rhs), the
+        # neighbours the lookaheads come from and the inconsistent vertices
+        self._distances = dict(enumerate(arrays['distances'].tolist()))
+        self._lookaheads = dict(self._distances)
+        self._previous = dict(enumerate(arrays['previous'].tolist()))
+        self._heap = []
+        self._edges = None
+        self._routeEdges = None
+
+################################################################################
+
+    @property
+    def vertices(self):
+        """
+        Ids of the vertices in the order of points and distances.
+        """
+
+        return list(self._points)
+
+################################################################################
+
+    @property
+    def points(self):
+        """
+        (x, y) of every vertex.
+        """
+
+        return list(self._points.values())
+
+################################################################################
+
+    @property
+    def distances(self):
+        """
+        Distance from the start of every vertex.
+        """
+
+        return [self._distances[vertex] for vertex in self._points]
+
+################################################################################
+
+    def neighbours(self, vertex):
+        """
+
+        """
+
+        return list(self._adjacency[vertex])
+
+################################################################################
+
+    @property
+    def walls(self):
+        """
+        The current walls as an array of (left, top, right, bottom) rows.
+        """
+
+        return np.array(list(self._walls.values()), dtype=np.float64).reshape(-1, 4)
+
+################################################################################
+
+    @property
+    def wallIndex(self):
+        """
+        WallIndex of the current walls.
+        """
+
+        return self._wallIndex
+
+################################################################################
+
+    @property
+    def edges(self):
+        """
+        ((x1, y1), (x2, y2)) of every undirected edge; built once per change.
+        """
+
+        if self._edges is None:
+            self._edges = [(self._points[vertex], self._points[neighbour])
+                           for vertex, neighbours in self._adjacency.items() for neighbour in neighbours
+                           if vertex < neighbour]
+        return self._edges
+
+################################################################################
+
+    @property
+    def shortestRouteDistance(self):
+        """
+
+        """
+
+        if self._goal is None:
+            return inf
+        return self._distances[self._goal]
+
+################################################################################
+
+    @property
+    def shortestRouteEdges(self):
+        """
+
+        """
+
+        if self._routeEdges is None:
+            self._routeEdges = []
+            if self._goal is not None and self._distances[self._goal] < inf:
+                vertex = self._goal
+                while self._previous[vertex] >= 0:
+                    self._routeEdges.append((self._points[vertex], self._points[self._previous[vertex]]))
+                    vertex = self._previous[vertex]
+        return self._routeEdges
+
+################################################################################
+
+    def addWall(self, wall):
+        """
+        Adds a (left, top, right, bottom) wall. The edges crossing it are
+        tested again and dropped when it blocks them; its corners in the
+        allowed area are connected to every vertex they see.
+        """
+
+        wall = tuple(float(value) for value in wall)
+        owner = self._nextWall
+        self._nextWall += 1
+        self._walls[owner] = wall
+        self._wallIndex = WallIndex(list(self._walls.values()))
+        changed = set()
+
+        vertices1, vertices2 = self._edgeArrays()
+        crossing = self._crossing(vertices1, vertices2, wall)
+        vertices1, vertices2 = vertices1[crossing], vertices2[crossing]
+        blocked = ~self._free(vertices1, vertices2)
+        for vertex1, vertex2 in zip(vertices1[blocked].tolist(), vertices2[blocked].tolist()):
+            del self._adjacency[vertex1][vertex2]
+            del self._adjacency[vertex2][vertex1]
+            changed.update((vertex1, vertex2))
+
+        corners, _ = VisibilityGraph._corners([wall], self._allowedArea)
+        others = np.array(list(self._points), dtype=np.int64)
+        added = np.arange(self._nextVertex, self._nextVertex+len(corners))
+        self._nextVertex += len(corners)
+        self._coordinates = np.vstack((self._coordinates, np.array(corners, dtype=np.float64).reshape(-1, 2)))
+        for vertex, corner in zip(added.tolist(), corners):
+            self._points[vertex] = corner
+            self._owners[vertex] = owner
+            self._adjacency[vertex] = {}
+            self._distances[vertex] = inf
+            self._lookaheads[vertex] = inf
+            self._previous[vertex] = -1
+        # the new corners with every old vertex and with each other, apart
+        # from those hidden behind a wall
+        walls = self._interiorWalls()
+        vertices1, vertices2 = [], []
+        for position, vertex in enumerate(added.tolist()):
+            targets = np.concatenate((others, added[position+1:]))
+            targets = targets[~VisibilityGraph._hidden(self._coordinates[vertex], self._coordinates[targets], walls)]
+            vertices1.append(np.full(len(targets), vertex))
+            vertices2.append(targets)
+        vertices1 = np.concatenate(vertices1+[np.zeros(0, dtype=np.int64)])
+        vertices2 = np.concatenate(vertices2+[np.zeros(0, dtype=np.int64)])
+        self._connect(vertices1, vertices2, self._free(vertices1, vertices2))
+        changed.update(added.tolist())
+        self._repair(changed)
+
+################################################################################
+
+    def removeWall(self, wall):
+        """
+        Removes a wall equal to the given one; ValueError if there is none.
+        Its corners leave the graph and only the vertex pairs crossing it
+        that weren't edges are tested again.
+        """
+
+        wall = tuple(float(value) for value in wall)
+        owner = next((index for index, other in self._walls.items() if other == wall), None)
+        if owner is None:
+            raise ValueError('no such wall: '+str(wall))
+        del self._walls[owner]
+        self._wallIndex = WallIndex(list(self._walls.values()))
+        changed = set()
+
+        removed = [vertex for vertex, other in self._owners.items() if other == owner]
+        for vertex in removed:
+            for neighbour in self._adjacency.pop(vertex):
+                del self._adjacency[neighbour][vertex]
+                changed.add(neighbour)
+            for vertexData in (self._points, self._owners, self._distances, self._lookaheads, self._previous):
+                del vertexData[vertex]
+        changed.difference_update(removed)
+
+        # the vertex pairs in its shadow that weren't edges, apart from those
+        # still hidden behind another wall
+        vertices = np.array(list(self._points), dtype=np.int64)
+        walls = self._interiorWalls()
+        vertices1, vertices2 = [], []
+        for position, vertex in enumerate(vertices.tolist()):
+            others = vertices[position+1:]
+            others = others[self._crossing(np.full(len(others), vertex), others, wall)]
+            others = np.array([other for other in others.tolist() if other not in self._adjacency[vertex]], dtype=np.int64)
+            if len(others) == 0:
+                continue
+            others = others[~VisibilityGraph._hidden(self._coordinates[vertex], self._coordinates[others], walls)]
+            vertices1.append(np.full(len(others), vertex))
+            vertices2.append(others)
+        vertices1 = np.concatenate(vertices1+[np.zeros(0, dtype=np.int64)])
+        vertices2 = np.concatenate(vertices2+[np.zeros(0, dtype=np.int64)])
+        free = self._free(vertices1, vertices2)
+        self._connect(vertices1, vertices2, free)
+        changed.update(vertices1[free].tolist())
+        changed.update(vertices2[free].tolist())
+        self._repair(changed)
+
+################################################################################
+
+    def _edgeArrays(self):
+        """
+        Vertex ids of both ends of every undirected edge.
+        """
+
+        edges = [(vertex, neighbour) for vertex, neighbours in self._adjacency.items() for neighbour in neighbours
+                 if vertex < neighbour]
+        edges = np.array(edges, dtype=np.int64).reshape(-1, 2)
+        return edges[:, 0], edges[:, 1]
+
+################################################################################
+
+    def _interiorWalls(self):
+        """
+        The walls that can hide something, see VisibilityGraph._hidden().
+        """
+
+        walls = self.walls
+        return walls[(walls[:, 2] > walls[:, 0]) & (walls[:, 3] > walls[:, 1])]
+
+################################################################################
+
+    def _crossing(self, vertices1, vertices2, wall):
+        """
+        Flags of the vertex pairs whose segment may touch the wall; a
+        superset of those the exact test hits in either direction.
+        """
+
+        return _crossesBox(self._coordinates[vertices1], self._coordinates[vertices2], wall, self.MARGIN)
+
+################################################################################
+
+    def _free(self, vertices1, vertices2):
+        """
+        Flags of the vertex pairs to be connected: either direction of the
+        segment between them is free, as in VisibilityGraph.
+        """
+
+        forward = np.hstack((self._coordinates[vertices1], self._coordinates[vertices2]))
+        backward = np.hstack((self._coordinates[vertices2], self._coordinates[vertices1]))
+        return ~(self._wallIndex.intersectsAny(forward) & self._wallIndex.intersectsAny(backward))
+
+################################################################################
+
+    def _connect(self, vertices1, vertices2, free):
+        """
+        Adds the edges of the free vertex pairs.
+        """
+
+        vertices1, vertices2 = vertices1[free], vertices2[free]
+        weights = np.hypot(*(self._coordinates[vertices2]-self._coordinates[vertices1]).T)
+        for vertex1, vertex2, weight in zip(vertices1.tolist(), vertices2.tolist(), weights.tolist()):
+            self._adjacency[vertex1][vertex2] = weight
+            self._adjacency[vertex2][vertex1] = weight
+
+################################################################################
+
+    def _repair(self, vertices):
+        """
+        LPA* from the start: the vertices whose edges changed get their
+        lookaheads recomputed, then the inconsistent vertices are settled in
+        the order of min(distance, lookahead) until none is left. A vertex
+        whose distance dropped takes its lookahead, one whose distance grew is
+        reset to inf and queued again; either way its neighbours follow.
+        """
+
+        self._edges = None
+        self._routeEdges = None
+        for vertex in vertices:
+            self._updateVertex(vertex)
+        while self._heap:
+            key, vertex = heappop(self._heap)
+            # removed vertices and outdated entries
+            if vertex not in self._points:
+                continue
+            distance, lookahead = self._distances[vertex], self._lookaheads[vertex]
+            if distance == lookahead or key != min(distance, lookahead):
+                continue
+            if distance > lookahead:
+                self._distances[vertex] = lookahead
+            else:
+                self._distances[vertex] = inf
+                self._updateVertex(vertex)
+            for neighbour in self._adjacency[vertex]:
+                self._updateVertex(neighbour)
+
+################################################################################
+
+    def _updateVertex(self, vertex):
+        """
+        Recomputes the lookahead of the vertex and queues it when it's
+        inconsistent.
+        """
+
+        if vertex != 0:
+            lookahead, previous = inf, -1
+            for neighbour, weight in self._adjacency[vertex].items():
+                distance = self._distances[neighbour]+weight
+                if distance < lookahead:
+                    lookahead, previous = distance, neighbour
+            self._lookaheads[vertex] = lookahead
+            self._previous[vertex] = previous
+        distance, lookahead = self._distances[vertex], self._lookaheads[vertex]
+        if distance != lookahead:
+            heappush(self._heap, (min(distance, lookahead), vertex))
+
+################################################################################
+
+class GoalDistanceOracle():
+    """
+    Shortest obstacle-aware distance from any point to the goal. Dijkstra runs
+    once from the goal over the static corner graph; a query only tests
+    visibility of the goal and of the corners from the point.
+    """
+
+    QUERY_CHUNK = 1024
+
+################################################################################
+
+    def __init__(self, goalPoint, walls, allowedArea, reduced=False, cacheDirectory=CACHE_DIRECTORY):
+        """
+        reduced: query the reduced visibility graph, far fewer corners; the
+        distances of points in the free space stay the same
+        cacheDirectory: where the graph of the corners is cached, None
+        disables the disk cache
+        """
+
+        self._goalPoint = np.asarray(goalPoint, dtype=np.float64)
+        self._wallIndex = WallIndex.of(walls)
+        self._allowedArea = tuple(float(value) for value in allowedArea)
+        # the goal is the start of the graph, so it is a corner at the distance 0 too
+        self._graph = VisibilityGraph(tuple(goalPoint), None, self._wallIndex, allowedArea, reduced=reduced,
+                                      cacheDirectory=cacheDirectory)
+        self._corners = np.array(self._graph.points, dtype=np.float64).reshape(-1, 2)
+        self._cornerDistances = np.array(self._graph.distances, dtype=np.float64)
+
+################################################################################
+
+    @property
+    def graph(self):
+        """
+        Visibility graph spreading the distances from the goal.
+        """
+
+        return self._graph
+
+################################################################################
+
+    def distance(self, point):
+        """
+
+        """
+
+        return float(self.distances([point])[0])
+
+################################################################################
+
+    def distances(self, points):
+        """
+        Distances to the goal of an array of points; inf where the goal can't
+        be reached.
+        """
+
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        distances = np.empty(len(points))
+        for first in range(0, len(points), self.QUERY_CHUNK):
+            chunk = points[first:first+self.QUERY_CHUNK]
+            starts = np.repeat(chunk, len(self._corners), axis=0)
+            ends = np.tile(self._corners, (len(chunk), 1))
+            # the graph connects two points when either direction of the edge is free
+            blocked = self._wallIndex.intersectsAny(np.hstack((starts, ends))) & self._wallIndex.intersectsAny(np.hstack((ends, starts)))
+            blocked = blocked.reshape(len(chunk), len(self._corners))
+            toCorners = np.hypot(*(chunk[:, np.newaxis, :]-self._corners[np.newaxis, :, :]).transpose(2, 0, 1))
+            distances[first:first+self.QUERY_CHUNK] = np.where(blocked, inf, toCorners+self._cornerDistances).min(axis=1)
+        return distances
+
+################################################################################
+
+    def lowerBounds(self, points, tolerance):
+        """
+        Lower bounds of the length of any free path from the points to within
+        tolerance of the goal. The obstacle-aware distance is only used when
+        the walls inside the allowed area keep clear of that disk, so that
+        each of its points sees the goal; the straight-line distance
+        otherwise.
+        """
+
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        bounds = np.hypot(points[:, 0]-self._goalPoint[0], points[:, 1]-self._goalPoint[1])
+        left, top, right, bottom = self._allowedArea
+        walls = self._wallIndex.walls
+        inside = (walls[:, 0] < right) & (walls[:, 2] > left) & (walls[:, 1] < bottom) & (walls[:, 3] > top)
+        walls = walls[inside]
+        x, y = self._goalPoint
+        wallDistances = np.hypot(np.maximum.reduce([walls[:, 0]-x, np.zeros(len(walls)), x-walls[:, 2]]),
+                                 np.maximum.reduce([walls[:, 1]-y, np.zeros(len(walls)), y-walls[:, 3]]))
+        if (wallDistances >= tolerance).all():
+            bounds = np.maximum(bounds, self.distances(points))
+        return bounds-tolerance
+
+################################################################################
+
+class DynamicGoalDistanceOracle(GoalDistanceOracle):
+    """
+    GoalDistanceOracle of walls that change: the graph spreading the
+    distances from the goal follows every added and removed wall
+    incrementally (see DynamicVisibilityGraph).
+    """
+
+################################################################################
+
+    def __init__(self, goalPoint, walls, allowedArea, cacheDirectory=CACHE_DIRECTORY):
+        """
+        cacheDirectory: where the initial graph of the corners is looked up,
+        see GoalDistanceOracle
+        """
+
+        self._goalPoint = np.asarray(goalPoint, dtype=np.float64)
+        self._allowedArea = tuple(float(value) for value in allowedArea)
+        self._graph = DynamicVisibilityGraph(tuple(goalPoint), None, walls, allowedArea, cacheDirectory)
+        self._update()
+
+################################################################################
+
+    def addWall(self, wall):
+        """
+
+        """
+
+        self._graph.addWall(wall)
+        self._update()
+
+################################################################################
+
+    def removeWall(self, wall):
+        """
+        ValueError if there is no such wall.
+        """
+
+        self._graph.removeWall(wall)
+        self._update()
+
+################################################################################
+
+    def _update(self):
+        """
+        Takes over the walls and the corner distances of the graph.
+        """
+
+        self._wallIndex = self._graph.wallIndex
+        self._corners = np.array(self._graph.points, dtype=np.float64).reshape(-1, 2)
+        self._cornerDistances = np.array(self._graph.distances, dtype=np.float64)
+
+################################################################################
+
+class DistanceField():
+    """
+    Obstacle-aware distance to the goal rasterized over the allowed area.
+    Grid nodes the goal sees directly get their exact distance, the rest is
+    filled by a wavefront (8-neighbour Dijkstra) around the walls. Queries are
+    bilinear interpolations of the node distances. Built fields are cached on
+    disk, keyed by the goal, the allowed area, the walls and the resolution.
+    """
+
+    RESOLUTION = 5
+    # (row, column) offsets of the neighbours
+    NEIGHBOURS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+
+################################################################################
+
+    def __init__(self, goalPoint, walls, allowedArea, resolution=RESOLUTION, cacheDirectory=CACHE_DIRECTORY):
+        """
+        cacheDirectory None disables the disk cache.
+        """
+
+        self._goalPoint = np.asarray(goalPoint, dtype=np.float64)
+        self._wallIndex = WallIndex.of(walls)
+        self._walls = self._wallIndex.walls
+        self._allowedArea = tuple(float(value) for value in allowedArea)
+        self._resolution = resolution
+        left, top, right, bottom = self._allowedArea
+        self._columns = int(np.ceil((right-left)/resolution))+1
+        self._rows = int(np.ceil((bottom-top)/resolution))+1
+        self._field = _cached(cacheDirectory, 'distance_field', self.key, lambda: {'field': self._makeField()})['field']
+
+################################################################################
+
+    @property
+    def key(self):
+        """
+        Hash of everything the field depends on.
+        """
+
+        return _key(self._goalPoint, self._allowedArea, self._walls, self._resolution)
+
+################################################################################
+
+    @property
+    def field(self):
+        """
+        (rows, columns) array of node distances, inf where unreachable.
+        """
+
+        return self._field
+
+################################################################################
+
+    @property
+    def arrays(self):
+        """
+        Dictionary of the field, as stored by a cache.
+        """
+
+        return {'field': self._field}
+
+################################################################################
+
+    @property
+    def resolution(self):
+        """
+
+        """
+
+        return self._resolution
+
+################################################################################
+
+    def _nodes(self):
+        """
+
+        """
+
+        left, top, right, bottom = self._allowedArea
+        xs = np.minimum(left+np.arange(self._columns)*self._resolution, right)
+        ys = np.minimum(top+np.arange(self._rows)*self._resolution, bottom)
+        return np.stack(np.meshgrid(xs, ys), axis=-1)
+
+################################################################################
+
+    def _makeField(self):
+        """
+
+        """
+
+        nodes = self._nodes()
+        flatNodes = nodes.reshape(-1, 2)
+        field = np.full(len(flatNodes), inf)
+
+        # nodes strictly inside a wall are never reached
+        x = flatNodes[:, 0, np.newaxis]
+        y = flatNodes[:, 1, np.newaxis]
+        left, top, right, bottom = (self._walls[np.newaxis, :, i] for i in range(4))
+        inWall = ((x > left) & (x < right) & (y > top) & (y < bottom)).any(axis=1)
+
+        # seeds: nodes with a free straight line to the goal
+        goals = np.tile(self._goalPoint, (len(flatNodes), 1))
+        visible = ~inWall & ~(self._wallIndex.intersectsAny(np.hstack((flatNodes, goals)))
+                              & self._wallIndex.intersectsAny(np.hstack((goals, flatNodes))))
+        field[visible] = np.hypot(*(flatNodes[visible]-self._goalPoint).T)
+
+        # blocked moves between neighbouring nodes
+        free = {}
+        for rowOffset, columnOffset in self.NEIGHBOURS:
+            rows = slice(max(0, -rowOffset), self._rows-max(0, rowOffset))
+            columns = slice(max(0, -columnOffset), self._columns-max(0, columnOffset))
+            neighbourRows = slice(rows.start+rowOffset, rows.stop+rowOffset)
+            neighbourColumns = slice(columns.start+columnOffset, columns.stop+columnOffset)
+            starts = nodes[rows, columns].reshape(-1, 2)
+            ends = nodes[neighbourRows, neighbourColumns].reshape(-1, 2)
+            mask = np.zeros((self._rows, self._columns), dtype=bool)
+            mask[rows, columns] = ~self._wallIndex.intersectsAny(np.hstack((starts, ends))).reshape(mask[rows, columns].shape)
+            free[(rowOffset, columnOffset)] = mask
+
+        # wavefront from the seeds; plain lists are much faster to index here
+        field = field.reshape(self._rows, self._columns)
+        blocked = inWall.reshape(self._rows, self._columns).tolist()
+        distances = field.tolist()
+        points = nodes.tolist()
+        free = {offset: mask.tolist() for offset, mask in free.items()}
+        visited = [[False]*self._columns for _ in range(self._rows)]
+        heap = [(distances[row][column], row, column) for row, column in zip(*np.nonzero(np.isfinite(field)))]
+        heap.sort()
+        while heap:
+            distance, row, column = heappop(heap)
+            if visited[row][column]:
+                continue
+            visited[row][column] = True
+            for offset in self.NEIGHBOURS:
+                if not free[offset][row][column]:
+                    continue
+                neighbourRow = row+offset[0]
+                neighbourColumn = column+offset[1]
+                if visited[neighbourRow][neighbourColumn] or blocked[neighbourRow][neighbourColumn]:
+                    continue
+                distanceNext = distance+dist(points[row][column], points[neighbourRow][neighbourColumn])
+                if distanceNext < distances[neighbourRow][neighbourColumn]:
+                    distances[neighbourRow][neighbourColumn] = distanceNext
+                    heappush(heap, (distanceNext, neighbourRow, neighbourColumn))
+        field = np.array(distances)
+        return field
+
+################################################################################
+
+    def distance(self, point):
+        """
+
+        """
+
+        return float(self.distances([point])[0])
+
+################################################################################
+
+    def distances(self, points):
+        """
+        Bilinear interpolation of the field for an array of points; corners of
+        the cell that are unreachable are left out.
+        """
+
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        left, top, right, bottom = self._allowedArea
+        column = np.clip((np.clip(points[:, 0], left, right)-left)/self._resolution, 0, self._columns-1)
+        row = np.clip((np.clip(points[:, 1], top, bottom)-top)/self._resolution, 0, self._rows-1)
+        column0 = np.minimum(np.floor(column).astype(np.int64), self._columns-2)
+        row0 = np.minimum(np.floor(row).astype(np.int64), self._rows-2)
+        u = column-column0
+        v = row-row0
+
+        weighted = np.zeros(len(points))
+        weights = np.zeros(len(points))
+        for rowOffset, columnOffset, weight in ((0, 0, (1-u)*(1-v)), (0, 1, u*(1-v)), (1, 0, (1-u)*v), (1, 1, u*v)):
+            values = self._field[row0+rowOffset, column0+columnOffset]
+            finite = np.isfinite(values)
+            weighted[finite] += weight[finite]*values[finite]
+            weights[finite] += weight[finite]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(weights > 0, weighted/weights, inf)
+
+################################################################################
+
+def prewarm(worlds, resolution=DistanceField.RESOLUTION, cacheDirectory=CACHE_DIRECTORY):
+    """
+    Builds and caches the precomputed structures of every world (anything
+    with the World attributes): the route graph, the graph of the goal
+    distance oracle and the distance field. Returns their cache keys.
+    """
+
+    keys = []
+    for world in worlds:
+        wallIndex = WallIndex(world.walls)
+        VisibilityGraph(world.startPoint, world.goalPoint, wallIndex, world.allowedArea, cacheDirectory=cacheDirectory)
+        GoalDistanceOracle(world.goalPoint, wallIndex, world.allowedArea, cacheDirectory=cacheDirectory)
+        keys.append(DistanceField(world.goalPoint, wallIndex, world.allowedArea, resolution, cacheDirectory).key)
+    return keys
+
+################################################################################
+
+def _key(*values):
+    """
+    Content hash of the values, each taken as an array of float64, and of
+    CACHE_VERSION.
+    """
+
+    key = sha1()
+    key.update(str(CACHE_VERSION).encode())
+    for value in values:
+        value = np.asarray(value, dtype=np.float64)
+        key.update(str(value.shape).encode())
+        key.update(value.tobytes())
+    return key.hexdigest()
+
+################################################################################
+
+# (name, key): arrays of the structures known before they're needed
+_preloaded = {}
+
+################################################################################
+
+def preload(entries):
+    """
+    Makes (name, key): arrays entries, as in a compiled map, available to the
+    constructors of the same structures without any computation.
+    """
+
+    _preloaded.update(entries)
+
+################################################################################
+
+def _cached(cacheDirectory, name, key, make):
+    """
+    The dictionary of arrays make() returns, stored in cacheDirectory as
+    name_key.npz and loaded from there next time; preloaded entries are
+    taken first. cacheDirectory None means no disk cache.
+    """
+
+    if (name, key) in _preloaded:
+        return _preloaded[name, key]
+    if cacheDirectory is None:
+        return make()
+    path = os.path.join(cacheDirectory, name+'_'+key+'.npz')
+    if os.path.exists(path):
+        with np.load(path) as arrays:
+            return dict(arrays)
+    arrays = make()
+    os.makedirs(cacheDirectory, exist_ok=True)
+    temporaryPath = path+'.'+str(os.getpid())+'.tmp.npz'
+    np.savez(temporaryPath, **arrays)
+    os.replace(temporaryPath, path)
+    return arrays
+
+################################################################################
+
+def _rangeMinimum(count, starts, stops, values):
+    """
+    For every position in range(count), the minimum of the values whose
+    [start, stop) range covers it (inf if none does). The ranges go into a
+    segment tree level by level and the minimums are pushed down to the
+    leaves.
+    """
+
+    size = 1
+    while size < count:
+        size *= 2
+    tree = np.full(2*size, inf)
+    starts = np.asarray(starts)+size
+    stops = np.asarray(stops)+size
+    keep = starts < stops
+    starts, stops, values = starts[keep], stops[keep], np.asarray(values)[keep]
+    while len(starts) > 0:
+        odd = (starts & 1) == 1
+        np.minimum.at(tree, starts[odd], values[odd])
+        starts = starts+odd
+        odd = (stops & 1) == 1
+        np.minimum.at(tree, stops[odd]-1, values[odd])
+        stops = stops-odd
+        starts, stops = starts >> 1, stops >> 1
+        keep = starts < stops
+        starts, stops, values = starts[keep], stops[keep], values[keep]
+    level = 1
+    while level < size:
+        parents = np.arange(level, 2*level)
+        tree[2*parents] = np.minimum(tree[2*parents], tree[parents])
+        tree[2*parents+1] = np.minimum(tree[2*parents+1], tree[parents])
+        level *= 2
+    return tree[size:size+count]
+
+################################################################################
+
+def _crossesBox(starts, ends, box, margin):
+    """
+    Liang-Barsky clipping: flags of the segments from starts to ends that
+    touch the (left, top, right, bottom) box grown by the margin.
+    """
+
+    starts = np.asarray(starts, dtype=np.float64).reshape(-1, 2)
+    vectors = np.asarray(ends, dtype=np.float64).reshape(-1, 2)-starts
+    enter = np.zeros(len(starts))
+    leave = np.ones(len(starts))
+    for axis in range(2):
+        low, high = box[axis]-margin, box[axis+2]+margin
+        parallel = vectors[:, axis] == 0
+        inside = (starts[:, axis] >= low) & (starts[:, axis] <= high)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            lows = (low-starts[:, axis])/vectors[:, axis]
+            highs = (high-starts[:, axis])/vectors[:, axis]
+        enter = np.maximum(enter, np.where(parallel, np.where(inside, -inf, inf), np.minimum(lows, highs)))
+        leave = np.minimum(leave, np.where(parallel, np.where(inside, inf, -inf), np.maximum(lows, highs)))
+    return enter <= leave
+
+################################################################################
+
+def _fuzzyEqual(a, b):
+    """
+    Same comparison QPointF's == operator does on every coordinate.
+    """
+
+    nearZero = (a == 0) | (b == 0)
+    return np.where(nearZero,
+                    np.abs(a-b) <= 1e-12,
+                    np.abs(a-b)*1e12 <= np.minimum(np.abs(a), np.abs(b)))
+
+################################################################################
+
+def _intersect(line1Start, line1End, line2Start, line2End):
+    """
+    Vectorized QLineF.intersect of line1 with line2. Returns (bounded,
+    unbounded, intersection point) arrays.
+    """
+
+    a = line1End-line1Start
+    b = line2Start-line2End
+    c = line1Start-line2Start
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        denominator = a[..., 1]*b[..., 0]-a[..., 0]*b[..., 1]
+        intersecting = (denominator != 0) & np.isfinite(denominator)
+        reciprocal = 1/np.where(intersecting, denominator, 1)
+        na = (b[..., 1]*c[..., 0]-b[..., 0]*c[..., 1])*reciprocal
+        nb = (a[..., 0]*c[..., 1]-a[..., 1]*c[..., 0])*reciprocal
+    point = line1Start+a*na[..., np.newaxis]
+    bounded = intersecting & (na >= 0) & (na <= 1) & (nb >= 0) & (nb <= 1)
+    return bounded, intersecting & ~bounded, point
 
 ################################################################################
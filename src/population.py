@@ -1,39 +1,50 @@
 __author__ = 'Tofu Gang'
 
-from PyQt5.QtCore import QObject, pyqtSignal as Signal
-from src.dot import Dot
-from random import uniform
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal as Signal
+from src.dot import Dots
+from src.evolution import Evolution
+from src.scheduler import Scheduler
+from time import monotonic
 
 ################################################################################
 
 class Population(QObject):
-    POPULATION_SIZE = 100
-    VECTORS_COUNT = 400
+    """
+    Qt front end of Evolution stepped by the scheduler; a single Dots item
+    draws all the simulated dots. In turbo mode the generations are
+    fast-forwarded as fast as the CPU allows and only the final state of
+    every TURBO_RENDER_INTERVAL-th generation is drawn.
+    """
+
+    POPULATION_SIZE = Evolution.POPULATION_SIZE
+    # seconds between two updateCounters emissions at most
+    COUNTERS_INTERVAL = 0.2
+    TURBO_RENDER_INTERVAL = 10
+    # seconds of simulation per scheduler tick in turbo mode, keeps the
+    # window responsive
+    TURBO_SLICE = 0.05
     updateCounters = Signal()
 
 ################################################################################
 
-    def __init__(self, scene):
+    def __init__(self, scene, populationSize=POPULATION_SIZE):
         """
 
         """
 
         super().__init__()
         self._scene = scene
-        self._finishedCounter = 0
-        self._generationCount = 0
-        self._wonCount = 0
-        self._exhaustedCount = 0
-        self._deadCount = 0
-        self._population = []
-        self._maxVectorsCount = self.VECTORS_COUNT
-
-        for _ in range(self.POPULATION_SIZE):
-            dot = Dot(self)
-            dot.setPos(self._scene.START_POINT)
-            self._scene.addItem(dot)
-            self._population.append(dot)
-            dot.brain.finished.connect(self._dotFinished)
+        self._evolution = Evolution(self._scene.world, populationSize)
+        self._dots = Dots(self._scene.sceneRect())
+        self._scene.addItem(self._dots)
+        self._syncDots()
+        self._scheduler = Scheduler(self)
+        self._scheduler.tick.connect(self._tick)
+        self._countersEmitted = 0
+        self._countersPending = False
+        self._turbo = False
+        self._startTime = None
+        self._solvedAfter = None
 
 ################################################################################
 
@@ -43,7 +54,17 @@ class Population(QObject):
 
         """
 
-        return self._maxVectorsCount
+        return self._evolution.maxVectorsCount
+
+################################################################################
+
+    @property
+    def counters(self):
+        """
+
+        """
+
+        return self._evolution.counters
 
 ################################################################################
 
@@ -53,7 +74,7 @@ class Population(QObject):
 
         """
 
-        return self._generationCount
+        return self._evolution.generationCount
 
 ################################################################################
 
@@ -63,7 +84,7 @@ class Population(QObject):
 
         """
 
-        return self._wonCount
+        return self._evolution.wonCount
 
 ################################################################################
 
@@ -73,7 +94,7 @@ class Population(QObject):
 
         """
 
-        return self._exhaustedCount
+        return self._evolution.exhaustedCount
 
 ################################################################################
 
@@ -83,7 +104,43 @@ class Population(QObject):
 
         """
 
-        return self._deadCount
+        return self._evolution.deadCount
+
+################################################################################
+
+    @property
+    def solvedAfter(self):
+        """
+        Seconds from start() to the end of the first tick in which a dot won;
+        None until then.
+        """
+
+        return self._solvedAfter
+
+################################################################################
+
+    @property
+    def turbo(self):
+        """
+
+        """
+
+        return self._turbo
+
+################################################################################
+
+    @turbo.setter
+    def turbo(self, value):
+        """
+        Leaving turbo mode brings the dots up to date with the simulation so
+        the real-time run goes on from where the fast-forward stopped.
+        """
+
+        if value != self._turbo:
+            self._turbo = value
+            self._scheduler.setDelay(0 if self._turbo else Scheduler.DELAY)
+            if not self._turbo:
+                self._syncDots()
 
 ################################################################################
 
@@ -92,80 +149,136 @@ class Population(QObject):
 
         """
 
-        [dot.start() for dot in self._population]
+        if self._startTime is None:
+            self._startTime = monotonic()
+        self._scheduler.start()
 
 ################################################################################
 
-    def _dotFinished(self):
+    def setWorld(self, world):
         """
+        Starts evolving a new population on another map.
+        """
+
+        self._evolution = Evolution(world, self._evolution.populationSize)
+        self._dots.setRect(self._scene.sceneRect())
+        self._solvedAfter = None
+        if self._startTime is not None:
+            self._startTime = monotonic()
+        self._syncDots()
+        self._emitCounters(force=True)
+
+################################################################################
 
+    @property
+    def world(self):
+        """
+        The map being evolved, with the walls added and removed so far.
         """
 
-        self._finishedCounter += 1
-        dotsWon = [dot for dot in self._population if dot.state is dot.State.WON]
-        self._wonCount = len(dotsWon)
-        if len(dotsWon) > 0:
-            self._maxVectorsCount = min(dot.usedVectorsCount for dot in dotsWon)
-        self._exhaustedCount = len([dot for dot in self._population if dot.state is dot.State.EXHAUSTED])
-        self._deadCount = len([dot for dot in self._population if dot.state is dot.State.DEAD])
+        return self._evolution.world
 
-        if self._finishedCounter == len(self._population):
-            self._nextGeneration()
-            self.start()
+################################################################################
 
-        self.updateCounters.emit()
+    def addWall(self, wall):
+        """
+        The dots collide with the wall from their next tick on, see
+        Evolution.addWall().
+        """
+
+        self._evolution.addWall(wall)
 
 ################################################################################
 
-    def _nextGeneration(self):
+    def removeWall(self, wall):
+        """
+        ValueError if there is no such custom wall.
         """
 
+        self._evolution.removeWall(wall)
+
+################################################################################
+
+    def _syncDots(self):
+        """
+        Shows the dots as of the current tick of the simulation.
         """
 
-        newGeneration = []
-        self._generationCount += 1
-        self._finishedCounter = 0
-        self._wonCount = 0
-        self._exhaustedCount = 0
-        self._deadCount = 0
+        simulation = self._evolution.simulation
+        self._dots.setDots(simulation.visiblePositions, simulation.states, self._evolution.generationCount > 0)
+
+################################################################################
 
-        # get the champion
-        champion = sorted([dot for dot in self._population], key=lambda dot: dot.fitnessFunction)[-1]
-        child = champion.child
-        child.dotType = child.Type.CHAMPION
-        child.setPos(self._scene.START_POINT)
-        self._scene.addItem(child)
-        newGeneration.append(child)
-        child.brain.finished.connect(self._dotFinished)
+    def _step(self):
+        """
 
-        # population size - 1 because of the champion already being in the next generation
-        for i in range(self.POPULATION_SIZE-1):
-            parent = self._getParent()
-            child = parent.child
-            child.mutate()
-            child.setPos(self._scene.START_POINT)
-            self._scene.addItem(child)
-            newGeneration.append(child)
-            child.brain.finished.connect(self._dotFinished)
+        """
 
-        [self._scene.removeItem(dot) for dot in self._population]
-        self._population.clear()
-        del self._population
-        self._population = newGeneration
+        finished = self._evolution.step()
+        if self._solvedAfter is None and self._startTime is not None and self._evolution.wonCount > 0:
+            self._solvedAfter = monotonic()-self._startTime
+        return finished
 
 ################################################################################
 
-    def _getParent(self):
+    def _tick(self):
         """
+        Advances every live dot by one step and updates the scene at once.
+        """
+
+        if self._turbo:
+            self._fastForward()
+            return
 
+        self._step()
+        finished = self._evolution.simulation.isFinished
+        if finished:
+            self._evolution.nextGeneration()
+        self._syncDots()
+        self._emitCounters(force=finished)
+
+################################################################################
+
+    def _fastForward(self):
+        """
+        Steps the evolution for TURBO_SLICE seconds without touching the
+        scene, except for the finished generations that get rendered.
+        """
+
+        deadline = monotonic()+self.TURBO_SLICE
+        while monotonic() < deadline:
+            self._step()
+            if self._evolution.simulation.isFinished:
+                if (self._evolution.generationCount+1)%self.TURBO_RENDER_INTERVAL == 0:
+                    self._syncDots()
+                self._evolution.nextGeneration()
+        self._emitCounters()
+
+################################################################################
+
+    def _emitCounters(self, force=False):
+        """
+        Emits updateCounters at most once per COUNTERS_INTERVAL; a skipped
+        update is delivered when the interval is over.
+        """
+
+        now = monotonic()
+        if force or now-self._countersEmitted >= self.COUNTERS_INTERVAL:
+            self._countersEmitted = now
+            self._countersPending = False
+            self.updateCounters.emit()
+        elif not self._countersPending:
+            self._countersPending = True
+            QTimer.singleShot(int(self.COUNTERS_INTERVAL*1000), self._flushCounters)
+
+################################################################################
+
+    def _flushCounters(self):
         """
 
-        rand = uniform(0, sum(dot.fitnessFunction for dot in self._population))
-        partialFitnessSum = 0
+        """
 
-        for dot in self._population:
-            partialFitnessSum += dot.fitnessFunction
-            if partialFitnessSum > rand:
-                return dot
+        if self._countersPending:
+            self._emitCounters(force=True)
 
 ################################################################################
@@ -0,0 +1,66 @@
+__author__ = 'Tofu Gang'
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal as Signal
+
+################################################################################
+
+class Scheduler(QObject):
+    """
+    Single clock driving the whole population; one tick signal per step
+    instead of one thread and one signal per dot.
+    """
+
+    DELAY = 0.1
+    tick = Signal()
+
+################################################################################
+
+    def __init__(self, parent=None):
+        """
+
+        """
+
+        super().__init__(parent)
+        self._timer = QTimer(self)
+        self._timer.setInterval(int(self.DELAY*1000))
+        self._timer.timeout.connect(self.tick)
+
+################################################################################
+
+    @property
+    def isActive(self):
+        """
+
+        """
+
+        return self._timer.isActive()
+
+################################################################################
+
+    def setDelay(self, delay):
+        """
+        Seconds between two ticks; 0 ticks whenever the event loop is idle.
+        """
+
+        self._timer.setInterval(int(delay*1000))
+
+################################################################################
+
+    def start(self):
+        """
+
+        """
+
+        if not self._timer.isActive():
+            self._timer.start()
+
+################################################################################
+
+    def stop(self):
+        """
+
+        """
+
+        self._timer.stop()
+
+################################################################################
@@ -0,0 +1,215 @@
+__author__ = 'Tofu Gang'
+
+import numpy as np
+from multiprocessing import Barrier, Process
+from multiprocessing.shared_memory import SharedMemory
+from os import cpu_count
+from threading import BrokenBarrierError
+from src.evolution import Evolution
+from src.genome import Genomes
+from src.path_finding import GoalDistanceOracle, DistanceField, WallIndex
+from src.simulation import Simulation
+
+################################################################################
+
+class SharedEvolution(Evolution):
+    """
+    Evolution whose generations are simulated and evaluated by worker
+    processes. The genomes, the per-dot state and the fitness live in shared
+    memory: every worker simulates its own slice of the rows in place and the
+    main process only does selection and mutation.
+
+    The workers advance in lockstep, one barrier per tick, so that a win in
+    any slice shortens the run of every dot exactly as in a single process.
+    """
+
+    # control block
+    BUFFER = 0
+    MAX_VECTORS_COUNT = 1
+    STOP = 2
+
+    # the workers keep the map they were started with
+    WALLS_FIXED = True
+
+################################################################################
+
+    def __init__(self, world, populationSize=Evolution.POPULATION_SIZE, distanceBackend=Evolution.DistanceBackend.ORACLE,
+                 selection=Evolution.Selection.ROULETTE, seed=None, workers=None):
+        """
+        workers None means one per CPU core.
+        """
+
+        # the generations are simulated elsewhere, from the start
+        super().__init__(world, populationSize, distanceBackend, selection, seed, None)
+        workers = max(1, min(workers or cpu_count() or 1, populationSize))
+        self._memory, self._arrays = _allocate(_layout(populationSize, self.VECTORS_COUNT, workers))
+        self._arrays['angles'][0] = self._genomes.angles
+        self._buffer = 0
+        self._genomes = Genomes(self._arrays['angles'][0], self._random)
+        self._simulation = self._makeSimulation()
+
+        self._start = Barrier(workers+1)
+        self._ticks = Barrier(workers)
+        names = {name: memory.name for name, memory in self._memory.items()}
+        bounds = np.linspace(0, populationSize, workers+1).astype(int)
+        self._workers = [Process(target=_work,
+                                 args=(index, slice(bounds[index], bounds[index+1]), world, distanceBackend, names,
+                                       _layout(populationSize, self.VECTORS_COUNT, workers), self._start, self._ticks),
+                                 daemon=True)
+                         for index in range(workers)]
+        [worker.start() for worker in self._workers]
+
+################################################################################
+
+    def close(self):
+        """
+        Stops the workers and releases the shared memory.
+        """
+
+        if self._workers:
+            self._arrays['control'][self.STOP] = 1
+            try:
+                self._start.wait()
+            except BrokenBarrierError:
+                pass
+            [worker.join() for worker in self._workers]
+            self._workers = []
+            self._arrays.clear()
+            for memory in self._memory.values():
+                memory.close()
+                memory.unlink()
+
+################################################################################
+
+    def runGeneration(self):
+        """
+        Lets the workers simulate and evaluate the whole generation; the
+        counters are filled in once it's over.
+        """
+
+        control = self._arrays['control']
+        control[self.BUFFER] = self._buffer
+        control[self.MAX_VECTORS_COUNT] = self._maxVectorsCount
+        # the first wait starts the generation, the second one waits for its end
+        self._start.wait()
+        self._start.wait()
+
+        self._simulation.restore(Simulation.Snapshot(*(self._arrays[name] for name in Simulation.Snapshot._fields)))
+        states = self._simulation.states
+        won = states == self.State.WON.value
+        if won.any():
+            self._bestWinnerSteps = int(self._simulation.steps[won].min())
+            self._simulation.limit(self._bestWinnerSteps)
+        self._maxVectorsCount = self._simulation.maxVectorsCount
+        self._outcomeCounts = np.bincount(states, minlength=len(self.State)).tolist()
+        self._fitness = self._arrays['fitness'].copy()
+
+################################################################################
+
+    def _childrenBuffer(self):
+        """
+        The genomes are double-buffered: the children are bred into the
+        shared buffer the parents don't occupy.
+        """
+
+        self._buffer = 1-self._buffer
+        return self._arrays['angles'][self._buffer]
+
+################################################################################
+
+def _layout(populationSize, vectorsCount, workers):
+    """
+    Name, shape and dtype of every shared array.
+    """
+
+    return {'angles': ((2, populationSize, vectorsCount), Genomes.DTYPE),
+            'positions': ((populationSize, 2), np.float64),
+            'velocities': ((populationSize, 2), np.float64),
+            'accelerations': ((populationSize, 2), np.float64),
+            'distancesTravelled': ((populationSize,), np.float64),
+            'steps': ((populationSize,), np.int64),
+            'states': ((populationSize,), np.int8),
+            'fitness': ((populationSize,), np.float64),
+            'control': ((3,), np.int64),
+            # per tick: maxVectorsCount and alive dots count of every worker,
+            # double-buffered by the tick's parity
+            'limits': ((2, workers), np.int64),
+            'alive': ((2, workers), np.int64)}
+
+################################################################################
+
+def _allocate(layout):
+    """
+
+    """
+
+    memory = {}
+    arrays = {}
+    for name, (shape, dtype) in layout.items():
+        memory[name] = SharedMemory(create=True, size=max(1, int(np.prod(shape))*np.dtype(dtype).itemsize))
+        arrays[name] = np.ndarray(shape, dtype, memory[name].buf)
+        arrays[name].fill(0)
+    return memory, arrays
+
+################################################################################
+
+def _attach(names, layout):
+    """
+
+    """
+
+    memory = {name: SharedMemory(name=names[name]) for name in layout}
+    arrays = {name: np.ndarray(shape, dtype, memory[name].buf) for name, (shape, dtype) in layout.items()}
+    return memory, arrays
+
+################################################################################
+
+def _work(index, rows, world, distanceBackend, names, layout, start, ticks):
+    """
+    Worker process: simulates and evaluates the rows of every generation.
+    """
+
+    memory, arrays = _attach(names, layout)
+    try:
+        wallIndex = WallIndex(world.walls)
+        if distanceBackend is Evolution.DistanceBackend.FIELD:
+            goalDistance = DistanceField(world.goalPoint, wallIndex, world.allowedArea)
+        else:
+            goalDistance = GoalDistanceOracle(world.goalPoint, wallIndex, world.allowedArea)
+        control, limits, alive = arrays['control'], arrays['limits'], arrays['alive']
+        while True:
+            start.wait()
+            if control[SharedEvolution.STOP]:
+                break
+            simulation = Simulation(world.startPoint, world.goalPoint, world.goalTolerance, wallIndex,
+                                    arrays['angles'][control[SharedEvolution.BUFFER], rows],
+                                    int(control[SharedEvolution.MAX_VECTORS_COUNT]))
+            tick = 0
+            while True:
+                simulation.step()
+                tick += 1
+                parity = tick%2
+                limits[parity, index] = simulation.maxVectorsCount
+                alive[parity, index] = np.count_nonzero(simulation.aliveMask)
+                ticks.wait()
+                # every alive dot has used exactly tick vectors
+                maxVectorsCount = int(limits[parity].min())
+                simulation.limit(maxVectorsCount)
+                if alive[parity].sum() == 0 or tick >= maxVectorsCount:
+                    break
+
+            for name, values in zip(Simulation.Snapshot._fields, simulation.snapshot()):
+                arrays[name][rows] = values
+            Evolution.evaluate(simulation, goalDistance, arrays['fitness'][rows])
+            start.wait()
+    except BrokenBarrierError:
+        pass
+    except BaseException:
+        start.abort()
+        ticks.abort()
+        raise
+    finally:
+        arrays.clear()
+        [block.close() for block in memory.values()]
+
+################################################################################
@@ -0,0 +1,432 @@
+__author__ = 'Tofu Gang'
+
+import numpy as np
+from enum import Enum
+from collections import namedtuple
+from src.path_finding import WallIndex
+
+################################################################################
+
+class Simulation():
+    """
+    Batched dot engine. Position, velocity, acceleration, state and step index
+    of every dot in the population live in NumPy arrays and all the alive dots
+    are advanced by a single vectorized update per tick.
+    """
+
+    ACCELERATION_LIMIT = 5
+    # ticks between two pruning passes
+    PRUNING_INTERVAL = 4
+    # pruning passes between two obstacle-aware ones
+    OBSTACLE_PRUNING_INTERVAL = 5
+    PRUNING_MARGIN = 1e-6
+    Snapshot = namedtuple('Snapshot', ['positions', 'velocities', 'accelerations', 'distancesTravelled', 'steps', 'states'])
+
+    class State(Enum):
+        ALIVE = 0
+        WON = 1
+        EXHAUSTED = 2
+        DEAD = 3
+
+################################################################################
+
+    def __init__(self, startPoint, goalPoint, goalTolerance, walls, angles, maxVectorsCount, trajectories=None,
+                 pruning=None):
+        """
+        startPoint, goalPoint: (x, y)
+        walls: array-like of (left, top, right, bottom) rectangles or their
+        WallIndex
+        angles: array of shape (dots, genes) with the angle of the unit vector
+        of every gene of every dot
+        trajectories: optional Trajectories the run is recorded into; needed
+        by resume()
+        pruning: optional GoalDistanceOracle; once a win has limited the
+        vectors count, the dots that provably can't reach the goal within
+        their remaining vectors are exhausted early, where they stand; their
+        final positions differ from those of the full run
+        """
+
+        self._angles = np.asarray(angles)
+        self._goalPoint = np.asarray(goalPoint, dtype=np.float64)
+        self._goalTolerance = goalTolerance
+        self._wallIndex = WallIndex.of(walls)
+        self._maxVectorsCount = maxVectorsCount
+        count = len(self._angles)
+        self._positions = np.tile(np.asarray(startPoint, dtype=np.float64), (count, 1))
+        self._velocities = np.zeros((count, 2))
+        self._accelerations = np.zeros((count, 2))
+        self._distancesTravelled = np.zeros(count)
+        self._steps = np.zeros(count, dtype=np.int64)
+        self._states = np.full(count, self.State.ALIVE.value, dtype=np.int8)
+        # alive dots move in lockstep: the ones that have used more vectors
+        # than ticks passed (resumed ones) wait until the others catch up
+        self._tick = 0
+        self._simulatedSteps = 0
+        self._pruning = pruning
+        self._prunedCount = 0
+        self._savedSteps = 0
+        self._trajectories = trajectories
+        if self._trajectories is not None:
+            self._trajectories.record(np.arange(count), self._steps, self._positions, self._velocities,
+                                      self._accelerations, self._distancesTravelled)
+
+################################################################################
+
+    @property
+    def positions(self):
+        """
+
+        """
+
+        return self._positions
+
+################################################################################
+
+    @property
+    def velocities(self):
+        """
+
+        """
+
+        return self._velocities
+
+################################################################################
+
+    @property
+    def accelerations(self):
+        """
+
+        """
+
+        return self._accelerations
+
+################################################################################
+
+    @property
+    def distancesTravelled(self):
+        """
+
+        """
+
+        return self._distancesTravelled
+
+################################################################################
+
+    @property
+    def steps(self):
+        """
+        Used vectors count of every dot.
+        """
+
+        return self._steps
+
+################################################################################
+
+    @property
+    def states(self):
+        """
+        State.value of every dot.
+        """
+
+        return self._states
+
+################################################################################
+
+    @property
+    def maxVectorsCount(self):
+        """
+
+        """
+
+        return self._maxVectorsCount
+
+################################################################################
+
+    @property
+    def trajectories(self):
+        """
+
+        """
+
+        return self._trajectories
+
+################################################################################
+
+    @property
+    def simulatedSteps(self):
+        """
+        Dot steps actually computed so far, resumed prefixes excluded.
+        """
+
+        return self._simulatedSteps
+
+################################################################################
+
+    @property
+    def prunedCount(self):
+        """
+        Dots exhausted early by pruning.
+        """
+
+        return self._prunedCount
+
+################################################################################
+
+    @property
+    def savedSteps(self):
+        """
+        Vectors the pruned dots had left when they were exhausted; an upper
+        bound of the steps pruning saved.
+        """
+
+        return self._savedSteps
+
+################################################################################
+
+    @property
+    def visiblePositions(self):
+        """
+        Positions as of the current tick: a resumed dot still waiting is shown
+        where its recorded trajectory was at this tick.
+        """
+
+        waiting = np.flatnonzero(self.aliveMask & (self._steps > self._tick))
+        if len(waiting) == 0:
+            return self._positions
+        positions = self._positions.copy()
+        steps = np.full(len(waiting), self._tick//self._trajectories.interval*self._trajectories.interval)
+        positions[waiting] = self._trajectories.snapshot(waiting, steps).positions
+        return positions
+
+################################################################################
+
+    @property
+    def aliveMask(self):
+        """
+
+        """
+
+        return self._states == self.State.ALIVE.value
+
+################################################################################
+
+    @property
+    def isFinished(self):
+        """
+
+        """
+
+        return not self.aliveMask.any()
+
+################################################################################
+
+    def step(self):
+        """
+        Advances all the alive dots by one vector. Returns indices of the dots
+        that finished (won, exhausted or died) in this tick.
+        """
+
+        # the dots at the limit are exhausted by limit() and never move again
+        alive = np.flatnonzero(self.aliveMask & (self._steps < self._maxVectorsCount))
+        if len(alive) == 0:
+            return alive
+
+        steps = self._steps[alive]
+        # nothing happens in the ticks nobody moves in
+        self._tick = max(self._tick, int(steps.min()))
+        active = alive[steps <= self._tick]
+        self._tick += 1
+        dead, moved = self._move(active)
+        toGoal = self._positions[moved]-self._goalPoint
+        won = np.hypot(toGoal[:, 0], toGoal[:, 1]) < self._goalTolerance
+        self._states[moved[won]] = self.State.WON.value
+        # nobody needs more vectors than the best winner did
+        exhausted = self.limit(int(self._steps[moved[won]].min()) if won.any() else self._maxVectorsCount)
+        if self._pruning is not None and self._maxVectorsCount < self._angles.shape[1] and self._tick%self.PRUNING_INTERVAL == 0:
+            obstacleAware = self._tick%(self.PRUNING_INTERVAL*self.OBSTACLE_PRUNING_INTERVAL) == 0
+            exhausted = np.concatenate((exhausted, self._prune(obstacleAware)))
+
+        return np.concatenate((dead, moved[won], exhausted))
+
+################################################################################
+
+    def _prune(self, obstacleAware):
+        """
+        Exhausts the alive dots that can't get within the goal tolerance in
+        their remaining vectors; returns their indices. With the acceleration
+        bounded by ACCELERATION_LIMIT, a dot is n steps later within
+        ACCELERATION_LIMIT*n*(n+1)/2 of where its velocity alone would take
+        it, and it can't have travelled farther than n*|velocity| plus that.
+        The first bound is checked every tick over spans of steps doubling in
+        length, the second one against the obstacle-aware distance only when
+        asked, it costs a visibility query. Pruning runs only once a win has
+        limited the vectors count, so no would-be winner is ever pruned.
+        """
+
+        # resumed dots still waiting are checked once they move
+        alive = np.flatnonzero(self.aliveMask & (self._steps <= self._tick))
+        if len(alive) == 0:
+            return alive
+        remaining = self._maxVectorsCount-self._steps[alive]
+        positions = self._positions[alive]-self._goalPoint
+        velocities = self._velocities[alive]
+        # spans [1, 1], [2, 3], [4, 7], ... of the steps ahead; in a span the
+        # drifted position is at least as far as the closest point of its
+        # segment and the deviation at most that of the span's last step
+        firsts = 1 << np.arange(int(remaining.max()).bit_length())
+        lasts = np.minimum(2*firsts-1, remaining[:, np.newaxis])
+        speeds = np.einsum('ij,ij->i', velocities, velocities)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            closest = -np.einsum('ij,ij->i', positions, velocities)/speeds
+        closest = np.clip(np.nan_to_num(closest)[:, np.newaxis], firsts, np.maximum(lasts, firsts))
+        drifts = positions[:, np.newaxis, :]+closest[..., np.newaxis]*velocities[:, np.newaxis, :]
+        deviations = self.ACCELERATION_LIMIT*lasts*(lasts+1)/2+self.PRUNING_MARGIN
+        reachable = (np.hypot(drifts[..., 0], drifts[..., 1])-self._goalTolerance <= deviations) & (firsts <= lasts)
+        pruned = ~reachable.any(axis=1)
+        if obstacleAware:
+            kept = np.flatnonzero(~pruned)
+            reach = remaining[kept]*np.sqrt(speeds[kept])+self.ACCELERATION_LIMIT*remaining[kept]*(remaining[kept]+1)/2
+            bounds = self._pruning.lowerBounds(self._positions[alive[kept]], self._goalTolerance)
+            pruned[kept] = bounds > reach+self.PRUNING_MARGIN
+        self._states[alive[pruned]] = self.State.EXHAUSTED.value
+        self._prunedCount += int(np.count_nonzero(pruned))
+        self._savedSteps += int(remaining[pruned].sum())
+        return alive[pruned]
+
+################################################################################
+
+    def _move(self, rows):
+        """
+        Applies the next vector of every row; returns the rows that crashed
+        into a wall and those that moved.
+        """
+
+        angles = self._angles[rows, self._steps[rows]].astype(np.float64)
+        accelerations = self._accelerations[rows]+np.stack((np.cos(angles), np.sin(angles)), axis=-1)
+        accMagnitudes = np.hypot(accelerations[:, 0], accelerations[:, 1])
+        tooFast = accMagnitudes > self.ACCELERATION_LIMIT
+        accelerations[tooFast] *= (self.ACCELERATION_LIMIT/accMagnitudes[tooFast])[:, np.newaxis]
+        velocities = self._velocities[rows]+accelerations
+        self._accelerations[rows] = accelerations
+        self._velocities[rows] = velocities
+        positions = self._positions[rows]
+        newPositions = positions+velocities
+        self._simulatedSteps += len(rows)
+
+        # collisions check
+        dead = self._wallIndex.intersectsAny(np.hstack((positions, newPositions)))
+        self._states[rows[dead]] = self.State.DEAD.value
+
+        moved = rows[~dead]
+        self._positions[moved] = newPositions[~dead]
+        self._steps[moved] += 1
+        self._distancesTravelled[moved] += np.hypot(velocities[~dead, 0], velocities[~dead, 1])
+        if self._trajectories is not None:
+            recorded = moved[self._steps[moved]%self._trajectories.interval == 0]
+            self._trajectories.record(recorded, self._steps[recorded], self._positions[recorded], self._velocities[recorded],
+                                      self._accelerations[recorded], self._distancesTravelled[recorded])
+        return rows[dead], moved
+
+################################################################################
+
+    def setWalls(self, walls, pruning=None):
+        """
+        Walls (or their WallIndex) the dots collide with from the next tick
+        on, with the pruning oracle that follows them; the moves already made
+        stay. The dots pruned before aren't brought back.
+        """
+
+        self._wallIndex = WallIndex.of(walls)
+        self._pruning = pruning
+
+################################################################################
+
+    def limit(self, maxVectorsCount):
+        """
+        Lowers maxVectorsCount (never raises it) and exhausts the alive dots
+        that have used that many vectors; returns their indices. Resumed dots
+        already past the limit are taken back to it.
+        """
+
+        self._maxVectorsCount = min(self._maxVectorsCount, maxVectorsCount)
+        alive = np.flatnonzero(self.aliveMask)
+        late = alive[self._steps[alive] > self._maxVectorsCount]
+        if len(late) > 0 and self._trajectories is not None:
+            self._rewind(late, self._maxVectorsCount)
+        exhausted = alive[self._steps[alive] >= self._maxVectorsCount]
+        self._states[exhausted] = self.State.EXHAUSTED.value
+        return exhausted
+
+################################################################################
+
+    def _rewind(self, rows, steps):
+        """
+        Takes the rows back to their state after steps vectors: the closest
+        recorded one and the few steps after it again.
+        """
+
+        interval = self._trajectories.interval
+        self.restore(self._trajectories.snapshot(rows, np.full(len(rows), steps//interval*interval)), rows)
+        for _ in range(steps%interval):
+            rows = rows[self._states[rows] == self.State.ALIVE.value]
+            self._move(rows)
+
+################################################################################
+
+    def resume(self, rows, trajectories, sourceRows, steps):
+        """
+        Starts the rows from the state trajectories recorded for sourceRows
+        after steps vectors (rounded down to the recording interval). The rows
+        must follow the same genes as their sources up to there. The rows
+        resumed at maxVectorsCount are exhausted right away; returns their
+        indices.
+        """
+
+        interval = self._trajectories.interval
+        steps = steps//interval*interval
+        if len(rows) > 0:
+            self._trajectories.copy(rows, trajectories, sourceRows, int(steps.max()))
+        self.restore(self._trajectories.snapshot(rows, steps), rows)
+        return self.limit(self._maxVectorsCount)
+
+################################################################################
+
+    def snapshot(self, rows=slice(None)):
+        """
+        Copies of the per-dot state arrays of the rows.
+        """
+
+        return self.Snapshot(self._positions[rows].copy(),
+                             self._velocities[rows].copy(),
+                             self._accelerations[rows].copy(),
+                             self._distancesTravelled[rows].copy(),
+                             self._steps[rows].copy(),
+                             self._states[rows].copy())
+
+################################################################################
+
+    def restore(self, snapshot, rows=slice(None), maxVectorsCount=None):
+        """
+        Overwrites the per-dot state of the rows by the snapshot.
+        """
+
+        self._positions[rows] = snapshot.positions
+        self._velocities[rows] = snapshot.velocities
+        self._accelerations[rows] = snapshot.accelerations
+        self._distancesTravelled[rows] = snapshot.distancesTravelled
+        self._steps[rows] = snapshot.steps
+        self._states[rows] = snapshot.states
+        if maxVectorsCount is not None:
+            self._maxVectorsCount = maxVectorsCount
+
+################################################################################
+
+    def run(self):
+        """
+        Steps the simulation until no dot is alive.
+        """
+
+        while not self.isFinished:
+            self.step()
+
+################################################################################
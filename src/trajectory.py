@@ -0,0 +1,87 @@
+__author__ = 'Tofu Gang'
+
+import numpy as np
+from src.simulation import Simulation
+
+################################################################################
+
+class Trajectories():
+    """
+    Per-dot motion state (position, velocity, acceleration, distance
+    travelled) recorded every INTERVAL steps of a simulation, one slot per
+    recorded step. A child identical to its parent up to some gene resumes
+    from the parent's recorded state instead of starting over.
+    """
+
+    # a state between two recorded ones is simulated again from the earlier
+    # one, so a sparser interval stays exact and costs a few steps only
+    INTERVAL = 8
+
+################################################################################
+
+    def __init__(self, count, vectorsCount, interval=INTERVAL):
+        """
+
+        """
+
+        self._interval = interval
+        slots = vectorsCount//interval+1
+        self._positions = np.empty((slots, count, 2))
+        self._velocities = np.empty((slots, count, 2))
+        self._accelerations = np.empty((slots, count, 2))
+        self._distancesTravelled = np.empty((slots, count))
+
+################################################################################
+
+    @property
+    def interval(self):
+        """
+
+        """
+
+        return self._interval
+
+################################################################################
+
+    def record(self, rows, steps, positions, velocities, accelerations, distancesTravelled):
+        """
+        Stores the state of the rows that have just used steps vectors, where
+        steps are multiples of the interval.
+        """
+
+        slots = steps//self._interval
+        self._positions[slots, rows] = positions
+        self._velocities[slots, rows] = velocities
+        self._accelerations[slots, rows] = accelerations
+        self._distancesTravelled[slots, rows] = distancesTravelled
+
+################################################################################
+
+    def copy(self, rows, source, sourceRows, steps):
+        """
+        Takes over what source recorded for sourceRows up to steps vectors.
+        """
+
+        slots = slice(steps//self._interval+1)
+        self._positions[slots, rows] = source._positions[slots, sourceRows]
+        self._velocities[slots, rows] = source._velocities[slots, sourceRows]
+        self._accelerations[slots, rows] = source._accelerations[slots, sourceRows]
+        self._distancesTravelled[slots, rows] = source._distancesTravelled[slots, sourceRows]
+
+################################################################################
+
+    def snapshot(self, rows, steps):
+        """
+        Simulation.Snapshot of the alive rows after steps vectors, where steps
+        are multiples of the interval.
+        """
+
+        slots = steps//self._interval
+        return Simulation.Snapshot(self._positions[slots, rows],
+                                   self._velocities[slots, rows],
+                                   self._accelerations[slots, rows],
+                                   self._distancesTravelled[slots, rows],
+                                   steps,
+                                   np.full(len(rows), Simulation.State.ALIVE.value, dtype=np.int8))
+
+################################################################################
@@ -0,0 +1,169 @@
+__author__ = 'Tofu Gang'
+
+import json
+import numpy as np
+from hashlib import sha1
+
+################################################################################
+
+class World():
+    """
+    Plain description of a map: points are (x, y) tuples, rectangles are
+    (left, top, right, bottom) tuples.
+    """
+
+    WIDTH = 800
+    HEIGHT = 800
+    WALL_THICKNESS = 5
+
+################################################################################
+
+    def __init__(self, allowedArea, startPoint, goalPoint, goalTolerance, wallsCustom, wallsSurrounding=None):
+        """
+        Without explicit surrounding walls the allowed area gets closed by
+        walls of WALL_THICKNESS.
+        """
+
+        self._allowedArea = tuple(float(value) for value in allowedArea)
+        self._startPoint = tuple(float(value) for value in startPoint)
+        self._goalPoint = tuple(float(value) for value in goalPoint)
+        self._goalTolerance = goalTolerance
+        self._wallsCustom = [tuple(float(value) for value in wall) for wall in wallsCustom]
+        if wallsSurrounding is None:
+            wallsSurrounding = self._surroundingWalls(self._allowedArea)
+        self._wallsSurrounding = [tuple(float(value) for value in wall) for wall in wallsSurrounding]
+
+################################################################################
+
+    @classmethod
+    def default(cls):
+        """
+        The built-in map.
+        """
+
+        left, top, right, bottom = -cls.WIDTH/2, -cls.HEIGHT/2, cls.WIDTH/2, cls.HEIGHT/2
+        wallsCustom = [(left-cls.WALL_THICKNESS, cls.HEIGHT/4, left+cls.WIDTH-100, cls.HEIGHT/4+cls.WALL_THICKNESS),
+                       (left+100, 0, right+cls.WALL_THICKNESS, cls.WALL_THICKNESS)]
+        return cls((left, top, right, bottom), (0, cls.HEIGHT/2-20), (0, -cls.HEIGHT/2+20), 50, wallsCustom)
+
+################################################################################
+
+    @classmethod
+    def fromDescription(cls, description):
+        """
+        Inverse of description().
+        """
+
+        return cls(description['allowedArea'], description['startPoint'], description['goalPoint'],
+                   description['goalTolerance'], description['wallsCustom'], description['wallsSurrounding'])
+
+################################################################################
+
+    def description(self):
+        """
+        JSON-serializable dictionary of the map.
+        """
+
+        return {'allowedArea': self._allowedArea,
+                'startPoint': self._startPoint,
+                'goalPoint': self._goalPoint,
+                'goalTolerance': self._goalTolerance,
+                'wallsCustom': self._wallsCustom,
+                'wallsSurrounding': self._wallsSurrounding}
+
+################################################################################
+
+    @property
+    def key(self):
+        """
+        Hash of the description.
+        """
+
+        return sha1(json.dumps(self.description(), sort_keys=True).encode()).hexdigest()
+
+################################################################################
+
+    @classmethod
+    def _surroundingWalls(cls, allowedArea):
+        """
+
+        """
+
+        left, top, right, bottom = allowedArea
+        thickness = cls.WALL_THICKNESS
+        return [(left-thickness, top-thickness, left, bottom+thickness),
+                (right, top-thickness, right+thickness, bottom+thickness),
+                (left-thickness, top-thickness, right+thickness, top),
+                (left-thickness, bottom, right+thickness, bottom+thickness)]
+
+################################################################################
+
+    @property
+    def allowedArea(self):
+        """
+
+        """
+
+        return self._allowedArea
+
+################################################################################
+
+    @property
+    def startPoint(self):
+        """
+
+        """
+
+        return self._startPoint
+
+################################################################################
+
+    @property
+    def goalPoint(self):
+        """
+
+        """
+
+        return self._goalPoint
+
+################################################################################
+
+    @property
+    def goalTolerance(self):
+        """
+
+        """
+
+        return self._goalTolerance
+
+################################################################################
+
+    @property
+    def wallsCustom(self):
+        """
+
+        """
+
+        return self._wallsCustom
+
+################################################################################
+
+    @property
+    def wallsSurrounding(self):
+        """
+
+        """
+
+        return self._wallsSurrounding
+
+################################################################################
+
+    @property
+    def walls(self):
+        """
+        All the walls as an array of (left, top, right, bottom) rows.
+        """
+
+        return np.array(self._wallsCustom+self._wallsSurrounding, dtype=np.float64).reshape(-1, 4)
+
+################################################################################
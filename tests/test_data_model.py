@@ -0,0 +1,94 @@
+from unittest import TestCase, main
+import os
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtCore import QPointF
+from src.main_window import MainWindow
+from src.world import World
+
+################################################################################
+
+class TestDataModel(TestCase):
+
+################################################################################
+
+    @classmethod
+    def setUpClass(cls):
+        """
+
+        """
+
+        cls._application = QApplication.instance() or QApplication([])
+
+################################################################################
+
+    def setUp(self):
+        """
+
+        """
+
+        self._window = MainWindow(5)
+        self._window.show()
+        self._view = self._window.centralWidget()
+        self._model = self._view.scene()
+        self._application.processEvents()
+
+################################################################################
+
+    def tearDown(self):
+        """
+
+        """
+
+        self._window.close()
+
+################################################################################
+
+    def _color(self, point):
+        """
+        Color the view shows at the scene point.
+        """
+
+        self._application.processEvents()
+        image = self._view.viewport().grab().toImage()
+        return image.pixelColor(self._view.mapFromScene(QPointF(*point))).name()
+
+################################################################################
+
+    def testSetWorld(self):
+        """
+        The cached background follows the map switch.
+        """
+
+        default = World.default()
+        world = World(default.allowedArea, default.startPoint, (-200, 100), 40, [])
+        # inside the goal disks, off the graph's edges
+        oldGoal = (default.goalPoint[0]+15, default.goalPoint[1]+25)
+        newGoal = (world.goalPoint[0]+15, world.goalPoint[1]+25)
+        self.assertEqual(self._color(oldGoal), '#00ff00')
+        self.assertEqual(self._color(newGoal), '#ffffff')
+        self._model.setWorld(world)
+        self.assertEqual(self._model.world, world)
+        self.assertEqual(self._color(oldGoal), '#ffffff')
+        self.assertEqual(self._color(newGoal), '#00ff00')
+
+################################################################################
+
+    def testAddWall(self):
+        """
+        An added wall is drawn and a removed one disappears.
+        """
+
+        wall = (-100.0, -100.0, 100.0, -90.0)
+        self.assertEqual(self._color((0, -95)), '#ffffff')
+        self._model.addWall(wall)
+        self.assertEqual(self._color((0, -95)), '#ff0000')
+        self._model.removeWall(wall)
+        self.assertEqual(self._color((0, -95)), '#ffffff')
+
+################################################################################
+
+if __name__ == '__main__':
+    main()
+
+################################################################################
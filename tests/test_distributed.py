@@ -0,0 +1,66 @@
+from unittest import TestCase, main
+import numpy as np
+import socket
+import subprocess
+import sys
+from os.path import dirname, abspath
+from threading import Thread
+from time import sleep
+from src.distributed import DistributedEvolution, receive
+from src.evolution import Evolution
+from src.world import World
+
+################################################################################
+
+class TestDistributed(TestCase):
+
+################################################################################
+
+    def testGeneration(self):
+        """
+        Same outcomes as a single process with two localhost workers, one of
+        them joining after a worker died holding a batch.
+        """
+
+        world = World.default()
+        world = World(world.allowedArea, world.startPoint, (0, 300), 60, [])
+        evolution = Evolution(world, 40, seed=5)
+        workers = []
+        with DistributedEvolution(world, 40, seed=5) as distributed:
+            distributed.coordinator.BATCH_SIZE = 8
+            host, port = distributed.coordinator.address
+
+            def dyingWorker():
+                with socket.create_connection((host, port)) as connection:
+                    receive(connection)
+                    receive(connection)
+                for _ in range(2):
+                    workers.append(subprocess.Popen([sys.executable, 'main.py', '--worker', host+':'+str(port)],
+                                                    cwd=dirname(dirname(abspath(__file__)))))
+
+            thread = Thread(target=dyingWorker)
+            thread.start()
+            while distributed.coordinator.workersCount == 0:
+                sleep(0.01)
+            try:
+                for _ in range(3):
+                    evolution.runGeneration()
+                    distributed.runGeneration()
+                    self.assertEqual(distributed.counters, evolution.counters)
+                    self.assertTrue(np.array_equal(distributed.simulation.states, evolution.simulation.states))
+                    self.assertTrue(np.array_equal(distributed.simulation.steps, evolution.simulation.steps))
+                    self.assertTrue(np.allclose(distributed.simulation.positions, evolution.simulation.positions))
+                    self.assertTrue(np.allclose(distributed.fitness(), evolution.fitness()))
+                    evolution.nextGeneration()
+                    distributed.nextGeneration()
+            finally:
+                thread.join()
+        for worker in workers:
+            self.assertEqual(worker.wait(10), 0)
+
+################################################################################
+
+if __name__ == '__main__':
+    main()
+
+################################################################################
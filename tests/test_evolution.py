@@ -0,0 +1,185 @@
+from unittest import TestCase, main
+import numpy as np
+from os.path import join
+from tempfile import TemporaryDirectory
+from src.evolution import Evolution
+from src.path_finding import GoalDistanceOracle, DistanceField
+from src.world import World
+
+################################################################################
+
+class TestEvolution(TestCase):
+
+################################################################################
+
+    def setUp(self):
+        """
+
+        """
+
+        self._evolution = Evolution(World.default(), 20)
+
+################################################################################
+
+    def testGeneration(self):
+        """
+
+        """
+
+        self._evolution.runGeneration()
+        self.assertTrue(self._evolution.simulation.isFinished)
+        counts = self._evolution.wonCount+self._evolution.exhaustedCount+self._evolution.deadCount
+        self.assertEqual(counts, self._evolution.populationSize)
+        states = self._evolution.simulation.states
+        counters = self._evolution.counters
+        self.assertEqual(counters.won, np.count_nonzero(states == Evolution.State.WON.value))
+        self.assertEqual(counters.exhausted, np.count_nonzero(states == Evolution.State.EXHAUSTED.value))
+        self.assertEqual(counters.dead, np.count_nonzero(states == Evolution.State.DEAD.value))
+        fitness = self._evolution.fitness()
+        self.assertTrue((fitness > 0).all())
+
+        champion = self._evolution.genomes.angles[fitness.argmax()].copy()
+        self._evolution.nextGeneration()
+        self.assertEqual(self._evolution.generationCount, 1)
+        self.assertEqual(self._evolution.genomes.angles.shape, (self._evolution.populationSize, Evolution.VECTORS_COUNT))
+        self.assertTrue(np.array_equal(self._evolution.genomes.angles[0], champion))
+
+################################################################################
+
+    def testSelection(self):
+        """
+
+        """
+
+        fitness = np.array([1.0, 0.0, 1.0, 2.0])
+        roulette = Evolution(World.default(), 4, seed=1)
+        parents = roulette._selectParents(fitness, 1000)
+        self.assertNotIn(1, parents)
+        self.assertAlmostEqual(np.mean(parents == 3), 0.5, delta=0.05)
+        universal = Evolution(World.default(), 4, selection=Evolution.Selection.STOCHASTIC_UNIVERSAL, seed=1)
+        self.assertEqual(np.bincount(universal._selectParents(fitness, 8), minlength=4).tolist(), [2, 0, 2, 4])
+        tournament = Evolution(World.default(), 4, selection=Evolution.Selection.TOURNAMENT, seed=1)
+        parents = tournament._selectParents(fitness, 1000)
+        self.assertGreater(np.mean(parents == 3), 0.5)
+
+################################################################################
+
+    def testCheckpoint(self):
+        """
+        A resumed run breeds exactly the generations the original one does.
+        """
+
+        world = World.default()
+        world = World(world.allowedArea, world.startPoint, (0, 300), 60, [])
+        evolution = Evolution(world, 20, seed=3)
+        for _ in range(2):
+            evolution.runGeneration()
+            evolution.nextGeneration()
+        with TemporaryDirectory() as directory:
+            path = join(directory, 'checkpoint.npz')
+            evolution.saveCheckpoint(path)
+            resumed = Evolution.fromCheckpoint(path)
+        self.assertEqual(resumed.generationCount, 2)
+        self.assertEqual(resumed.maxVectorsCount, evolution.maxVectorsCount)
+        self.assertEqual(resumed.champion[0], evolution.champion[0])
+        self.assertTrue(np.array_equal(resumed.champion[1], evolution.champion[1]))
+        for _ in range(2):
+            evolution.runGeneration()
+            resumed.runGeneration()
+            self.assertEqual(resumed.counters, evolution.counters)
+            evolution.nextGeneration()
+            resumed.nextGeneration()
+            self.assertTrue(np.array_equal(resumed.genomes.angles, evolution.genomes.angles))
+
+################################################################################
+
+    def testResumedChildren(self):
+        """
+        Children resumed from their parents' trajectories end exactly where
+        children simulated from the start do, in fewer simulated steps.
+        """
+
+        world = World.default()
+        world = World(world.allowedArea, world.startPoint, (-200, 100), 40, [])
+        for interval in (1, 3, Evolution.SNAPSHOT_INTERVAL):
+            full = Evolution(world, 40, seed=1, snapshotInterval=None)
+            resumed = Evolution(world, 40, seed=1, snapshotInterval=interval)
+            buffers = set()
+            for _ in range(8):
+                buffers.add(id(resumed.simulation.trajectories))
+                full.runGeneration()
+                resumed.runGeneration()
+                self.assertEqual(resumed.counters, full.counters)
+                self.assertTrue(np.array_equal(resumed.simulation.states, full.simulation.states))
+                self.assertTrue(np.array_equal(resumed.simulation.positions, full.simulation.positions))
+                self.assertTrue(np.array_equal(resumed.fitness(), full.fitness()))
+                full.nextGeneration()
+                resumed.nextGeneration()
+            resumed.runGeneration()
+            full.runGeneration()
+            self.assertLess(resumed.simulation.simulatedSteps, full.simulation.simulatedSteps)
+            # the recording buffers take turns instead of being allocated anew
+            self.assertEqual(len(buffers), 2)
+
+################################################################################
+
+    def testPruning(self):
+        """
+        Pruning keeps the winners and the vectors count of the full run; only
+        the dots it exhausted early are scored differently.
+        """
+
+        world = World.default()
+        world = World(world.allowedArea, world.startPoint, (-200, 100), 40, [])
+        full = Evolution(world, 300, seed=0)
+        pruned = Evolution(world, 300, seed=0, pruning=True)
+        for evolution in (full, pruned):
+            evolution.runGeneration()
+            evolution.nextGeneration()
+            evolution.runGeneration()
+        self.assertGreater(pruned.counters.pruned, 0)
+        self.assertEqual(pruned.wonCount, full.wonCount)
+        self.assertEqual(pruned.maxVectorsCount, full.maxVectorsCount)
+        won = full.simulation.states == Evolution.State.WON.value
+        self.assertTrue(np.array_equal(pruned.simulation.states == Evolution.State.WON.value, won))
+        self.assertTrue(np.array_equal(pruned.fitness()[won], full.fitness()[won]))
+        same = pruned.simulation.steps == full.simulation.steps
+        self.assertTrue(np.array_equal(pruned.fitness()[same], full.fitness()[same]))
+
+################################################################################
+
+    def testWalls(self):
+        """
+        Walls added and removed during a generation end up in the map, the
+        dots collide with them from the next tick and the fitness is that of
+        the new walls.
+        """
+
+        world = World.default()
+        wall = (-100.0, 300.0, 100.0, 310.0)
+        backends = {Evolution.DistanceBackend.ORACLE: GoalDistanceOracle, Evolution.DistanceBackend.FIELD: DistanceField}
+        for distanceBackend in Evolution.DistanceBackend:
+            evolution = Evolution(world, 20, distanceBackend, seed=3, pruning=True)
+            evolution.step()
+            evolution.addWall(wall)
+            self.assertEqual(evolution.world.wallsCustom, world.wallsCustom+[wall])
+            # the dots right above the start run into the new wall
+            evolution.runGeneration()
+            self.assertEqual(evolution.deadCount, 20)
+            goalDistance = backends[distanceBackend](world.goalPoint, evolution.world.walls, world.allowedArea)
+            self.assertTrue(np.allclose(evolution.fitness(), Evolution.evaluate(evolution.simulation, goalDistance)))
+            evolution.nextGeneration()
+            evolution.removeWall(wall)
+            self.assertEqual(evolution.world.wallsCustom, world.wallsCustom)
+            evolution.runGeneration()
+            goalDistance = backends[distanceBackend](world.goalPoint, world.walls, world.allowedArea)
+            self.assertTrue(np.allclose(evolution.fitness(), Evolution.evaluate(evolution.simulation, goalDistance)))
+            with self.assertRaises(ValueError):
+                evolution.removeWall(wall)
+
+################################################################################
+
+if __name__ == '__main__':
+    main()
+
+################################################################################
@@ -0,0 +1,74 @@
+from unittest import TestCase, main
+import numpy as np
+import pickle
+from src.evolution import Evolution
+from src.islands import Islands
+from src.world import World
+
+################################################################################
+
+class TestIslands(TestCase):
+
+################################################################################
+
+    def testRun(self):
+        """
+
+        """
+
+        islands = Islands(World.default(), 2, 10, migrationInterval=2, migrantsCount=2, workers=2, seed=1)
+        reports = []
+        islands.run(3, lambda islands: reports.append(islands.generationCount))
+        self.assertEqual(reports, [2, 3])
+        self.assertEqual(len(islands.islands), 2)
+        for island in islands.islands:
+            self.assertEqual(island.generationCount, 3)
+            self.assertEqual(island.genomes.angles.shape, (10, Evolution.VECTORS_COUNT))
+        fitness, angles, index = islands.champion
+        self.assertIn(index, (0, 1))
+        self.assertGreaterEqual(fitness, max(island.champion[0] for island in islands.islands))
+        self.assertEqual(angles.shape, (Evolution.VECTORS_COUNT,))
+
+################################################################################
+
+    def testImmigrate(self):
+        """
+
+        """
+
+        evolution = Evolution(World.default(), 5, seed=1)
+        champion = evolution.genomes.angles[0].copy()
+        migrants = np.zeros((2, Evolution.VECTORS_COUNT))
+        evolution.immigrate(migrants)
+        self.assertTrue(np.array_equal(evolution.genomes.angles[0], champion))
+        self.assertTrue((evolution.genomes.angles[-2:] == 0).all())
+
+################################################################################
+
+    def testPickle(self):
+        """
+        An island travels without its trajectories and goes on exactly as
+        the one that stayed.
+        """
+
+        evolution = Evolution(World.default(), 50, seed=1)
+        evolution.runGeneration()
+        evolution.nextGeneration()
+        data = pickle.dumps(evolution)
+        self.assertLess(len(data), 2*evolution.genomes.angles.nbytes)
+        moved = pickle.loads(data)
+        for _ in range(2):
+            evolution.runGeneration()
+            moved.runGeneration()
+            self.assertEqual(moved.counters, evolution.counters)
+            self.assertTrue(np.array_equal(moved.fitness(), evolution.fitness()))
+            evolution.nextGeneration()
+            moved.nextGeneration()
+            self.assertTrue(np.array_equal(moved.genomes.angles, evolution.genomes.angles))
+
+################################################################################
+
+if __name__ == '__main__':
+    main()
+
+################################################################################
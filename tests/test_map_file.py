@@ -0,0 +1,59 @@
+from unittest import TestCase, main
+import json
+import os
+from tempfile import TemporaryDirectory
+import numpy as np
+from src.map_file import MapFile
+from src.path_finding import GoalDistanceOracle, VisibilityGraph, WallIndex
+from src.world import World
+
+################################################################################
+
+class TestMapFile(TestCase):
+
+################################################################################
+
+    def testCompile(self):
+        """
+        A compiled map preloads the same structures a build gives; editing
+        the map makes its sidecar stale.
+        """
+
+        world = World((-200, -200, 200, 200), (-190, -190), (190, 190), 10,
+                      [(-150, -100, 100, -95), (-100, 0, 150, 5), (-150, 100, 100, 105)])
+        built = VisibilityGraph(world.startPoint, world.goalPoint, world.walls, world.allowedArea)
+        oracle = GoalDistanceOracle(world.goalPoint, world.walls, world.allowedArea, cacheDirectory=None)
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'map.json')
+            MapFile.save(world, path)
+            mapFile = MapFile(path)
+            self.assertFalse(mapFile.compiled)
+            self.assertEqual(mapFile.world.description(), world.description())
+            mapFile.compile()
+            self.assertTrue(mapFile.compiled)
+            self.assertTrue(os.path.exists(mapFile.sidecarPath))
+
+            world = MapFile(path).world
+            self.assertTrue(MapFile(path).compiled)
+            # both come from the preloaded sidecar
+            graph = VisibilityGraph(world.startPoint, world.goalPoint, world.walls, world.allowedArea)
+            self.assertIs(graph.arrays, VisibilityGraph(world.startPoint, world.goalPoint, world.walls, world.allowedArea).arrays)
+            self.assertIs(WallIndex(world.walls).arrays, WallIndex(world.walls).arrays)
+            self.assertEqual(graph.edges, built.edges)
+            self.assertEqual(graph.shortestRouteDistance, built.shortestRouteDistance)
+            points = [(x, y) for x in range(-180, 200, 60) for y in range(-180, 200, 60)]
+            preloaded = GoalDistanceOracle(world.goalPoint, world.walls, world.allowedArea, cacheDirectory=None)
+            self.assertTrue(np.array_equal(preloaded.distances(points), oracle.distances(points)))
+
+            description = world.description()
+            description['goalTolerance'] = 20
+            with open(path, 'w') as file:
+                json.dump(description, file)
+            self.assertFalse(MapFile(path).compiled)
+
+################################################################################
+
+if __name__ == '__main__':
+    main()
+
+################################################################################
@@ -1,6 +1,14 @@
 from unittest import TestCase, main
+import os
+from tempfile import TemporaryDirectory
+from itertools import product
+from unittest.mock import patch
+import numpy as np
 from PyQt5.QtCore import QRectF, QPointF, QLineF
-from src.path_finding import PathFinding
+from src import path_finding
+from src.path_finding import PathFinding, WallIndex, VisibilityGraph, DynamicVisibilityGraph, GoalDistanceOracle, \
+    DynamicGoalDistanceOracle, DistanceField, prewarm
+from src.world import World
 
 ################################################################################
 
@@ -101,6 +109,217 @@ class TestPathFinding(TestCase):
         # the line is diagonal of the rectangle
         self.assertTrue(PathFinding.intersects(rect, QLineF(rect.topLeft(), rect.bottomRight())))
 
+################################################################################
+
+    def testIntersectsBatch(self):
+        """
+
+        """
+
+        rects = [QRectF(QPointF(-50, -10), QPointF(50, 10)), self._rect, QRectF(QPointF(0, 0), QPointF(100, 100))]
+        # points around, on the corners and on the sides of the rectangles
+        points = [QPointF(x, y) for x, y in product([-100, -50, -20, 0, 50, 100], [-100, -10, 0, 10, 100])]
+        lines = [QLineF(point1, point2) for point1, point2 in product(points, repeat=2) if point1 != point2]
+        segments = [(line.x1(), line.y1(), line.x2(), line.y2()) for line in lines]
+        walls = [(rect.left(), rect.top(), rect.right(), rect.bottom()) for rect in rects]
+        hits = PathFinding.intersectsBatch(segments, walls)
+        self.assertEqual(hits.shape, (len(lines), len(rects)))
+        for i, line in enumerate(lines):
+            for j, rect in enumerate(rects):
+                self.assertEqual(hits[i, j], PathFinding.intersects(rect, line), msg=str((line, rect)))
+        self.assertTrue(np.array_equal(PathFinding.intersectsBatch(segments, walls, anyHit=True), hits.any(axis=1)))
+        self.assertTrue(np.array_equal(PathFinding.intersectsPairs(segments, walls[0]), hits[:, 0]))
+
+################################################################################
+
+    def testWallIndex(self):
+        """
+
+        """
+
+        random = np.random.default_rng(0)
+        corners = np.round(random.uniform(-400, 400, (300, 2)))
+        walls = np.hstack((corners, corners+np.round(random.uniform(1, 40, (300, 2)))))
+        starts = random.uniform(-420, 420, (2000, 2))
+        segments = np.hstack((starts, starts+random.normal(0, 30, (2000, 2))))
+        # segments lying on wall sides and ending in wall corners
+        segments[:300] = walls[:, [0, 1, 2, 1]]
+        segments[300:600] = np.hstack((walls[:, 0:2], walls[:, 0:2]-10))
+        wallIndex = WallIndex(walls, 30)
+        self.assertTrue(np.array_equal(wallIndex.intersectsAny(segments), PathFinding.intersectsBatch(segments, walls, anyHit=True)))
+        hits = PathFinding.intersectsBatch(segments[:50], walls)
+        for segment, segmentHits in zip(segments[:50], hits):
+            self.assertTrue(set(np.flatnonzero(segmentHits)) <= set(wallIndex.candidates(segment)))
+
+################################################################################
+
+    def testVisibilityGraphSearch(self):
+        """
+
+        """
+
+        world = World.default()
+        dijkstra = VisibilityGraph(world.startPoint, world.goalPoint, world.walls, world.allowedArea)
+        aStar = VisibilityGraph(world.startPoint, world.goalPoint, world.walls, world.allowedArea, VisibilityGraph.Search.A_STAR)
+        self.assertAlmostEqual(dijkstra.shortestRouteDistance, aStar.shortestRouteDistance)
+        self.assertEqual(dijkstra.shortestRouteEdges, aStar.shortestRouteEdges)
+        route = dijkstra.shortestRouteEdges
+        self.assertEqual(route[0][0], world.goalPoint)
+        self.assertEqual(route[-1][1], world.startPoint)
+        self.assertAlmostEqual(sum(QLineF(QPointF(*point1), QPointF(*point2)).length() for point1, point2 in route),
+                               dijkstra.shortestRouteDistance)
+
+################################################################################
+
+    def testSweepBuilder(self):
+        """
+        The sweep gives the same edges as testing every pair, also with
+        overlapping walls and corners lying on other walls.
+        """
+
+        random = np.random.default_rng(5)
+        corners = random.integers(-40, 40, (80, 2))*10
+        walls = np.hstack((corners, corners+random.integers(1, 12, (80, 2))*5)).astype(np.float64)
+        worlds = [World.default(), World((-400, -400, 400, 400), (-395, -395), (395, 395), 5, walls)]
+        for world in worlds:
+            graphs = [VisibilityGraph(world.startPoint, world.goalPoint, world.walls, world.allowedArea, builder=builder)
+                      for builder in VisibilityGraph.Builder]
+            self.assertEqual(graphs[0].edges, graphs[1].edges)
+            self.assertEqual(graphs[0].shortestRouteDistance, graphs[1].shortestRouteDistance)
+
+################################################################################
+
+    def testReducedVisibilityGraph(self):
+        """
+        The reduced graph keeps the shortest routes and the distances of the
+        free points with fewer corners and edges.
+        """
+
+        # one wall per 100 x 100 cell, apart from each other
+        random = np.random.default_rng(2)
+        cells = np.array(list(product(range(-4, 4), repeat=2)))*100.0
+        sizes = random.integers(1, 10, (len(cells), 2))*10.0
+        walls = np.hstack((cells+5, cells+5+sizes))
+        worlds = [World.default(), World((-400, -400, 400, 400), (-395, -395), (395, 395), 5, walls)]
+        for world in worlds:
+            full = VisibilityGraph(world.startPoint, world.goalPoint, world.walls, world.allowedArea)
+            reduced = VisibilityGraph(world.startPoint, world.goalPoint, world.walls, world.allowedArea, reduced=True)
+            self.assertEqual(reduced.shortestRouteDistance, full.shortestRouteDistance)
+            self.assertEqual(reduced.shortestRouteEdges, full.shortestRouteEdges)
+            self.assertLessEqual(len(reduced.edges), len(full.edges))
+            points = random.uniform(-400, 400, (200, 2))
+            walls = world.walls
+            inside = (points[:, np.newaxis, 0] >= walls[:, 0]) & (points[:, np.newaxis, 0] <= walls[:, 2]) \
+                    &(points[:, np.newaxis, 1] >= walls[:, 1]) & (points[:, np.newaxis, 1] <= walls[:, 3])
+            points = points[~inside.any(axis=1)]
+            oracle = GoalDistanceOracle(world.goalPoint, world.walls, world.allowedArea)
+            reducedOracle = GoalDistanceOracle(world.goalPoint, world.walls, world.allowedArea, True)
+            self.assertTrue(np.allclose(reducedOracle.distances(points), oracle.distances(points)))
+        self.assertLess(len(reduced.edges), len(full.edges))
+
+################################################################################
+
+    def testDynamicVisibilityGraph(self):
+        """
+        After every added or removed wall, the graph and the oracle updated
+        incrementally are those built from scratch, also with overlapping
+        walls and corners lying on other walls.
+        """
+
+        world = World.default()
+        random = np.random.default_rng(7)
+        walls = [tuple(wall) for wall in world.walls.tolist()]
+        graph = DynamicVisibilityGraph(world.startPoint, world.goalPoint, walls, world.allowedArea)
+        oracle = DynamicGoalDistanceOracle(world.goalPoint, walls, world.allowedArea, cacheDirectory=None)
+        points = [(x, y) for x in range(-390, 400, 65) for y in range(-390, 400, 65)]
+        for _ in range(20):
+            if random.random() < 0.6:
+                corner = random.integers(-40, 40, 2)*10
+                wall = tuple(np.concatenate((corner, corner+random.integers(1, 12, 2)*5)).astype(float).tolist())
+                walls.append(wall)
+                graph.addWall(wall)
+                oracle.addWall(wall)
+            else:
+                wall = walls.pop(random.integers(len(walls)))
+                graph.removeWall(wall)
+                oracle.removeWall(wall)
+            built = VisibilityGraph(world.startPoint, world.goalPoint, walls, world.allowedArea)
+            self.assertEqual(sorted(tuple(sorted(edge)) for edge in graph.edges),
+                             sorted(tuple(sorted(edge)) for edge in built.edges))
+            for (point, distance), (builtPoint, builtDistance) in zip(sorted(zip(graph.points, graph.distances)),
+                                                                       sorted(zip(built.points, built.distances))):
+                self.assertEqual(point, builtPoint)
+                self.assertAlmostEqual(distance, builtDistance)
+            self.assertAlmostEqual(graph.shortestRouteDistance, built.shortestRouteDistance)
+            builtOracle = GoalDistanceOracle(world.goalPoint, walls, world.allowedArea, cacheDirectory=None)
+            self.assertTrue(np.allclose(oracle.distances(points), builtOracle.distances(points)))
+        with self.assertRaises(ValueError):
+            graph.removeWall((0, 0, 1, 1))
+
+################################################################################
+
+    def testGoalDistanceOracle(self):
+        """
+
+        """
+
+        world = World.default()
+        oracle = GoalDistanceOracle(world.goalPoint, world.walls, world.allowedArea)
+        points = [(x, y) for x in range(-390, 400, 65) for y in range(-390, 400, 65)]
+        distances = oracle.distances(points)
+        for point, distance in zip(points, distances):
+            visibilityGraph = VisibilityGraph(point, world.goalPoint, world.walls, world.allowedArea)
+            self.assertAlmostEqual(distance, visibilityGraph.shortestRouteDistance)
+
+################################################################################
+
+    def testDistanceField(self):
+        """
+
+        """
+
+        world = World.default()
+        oracle = GoalDistanceOracle(world.goalPoint, world.walls, world.allowedArea)
+        with TemporaryDirectory() as directory:
+            field = DistanceField(world.goalPoint, world.walls, world.allowedArea, 10, directory)
+            cached = DistanceField(world.goalPoint, world.walls, world.allowedArea, 10, directory)
+        self.assertTrue(np.array_equal(field.field, cached.field))
+        # the goal sees the nodes above the middle wall directly
+        self.assertAlmostEqual(field.distance((0, -200)), oracle.distance((0, -200)))
+        points = [(x, y) for x in range(-390, 400, 65) for y in range(-390, 400, 65)]
+        errors = np.abs(field.distances(points)-oracle.distances(points))/oracle.distances(points)
+        self.assertLess(np.median(errors), 0.05)
+
+################################################################################
+
+    def testCache(self):
+        """
+        A cached graph, oracle and field load the same as built; prewarm
+        fills the cache.
+        """
+
+        world = World.default()
+        oracle = GoalDistanceOracle(world.goalPoint, world.walls, world.allowedArea, cacheDirectory=None)
+        points = [(x, y) for x in range(-390, 400, 130) for y in range(-390, 400, 130)]
+        with TemporaryDirectory() as directory:
+            keys = prewarm([world], 10, directory)
+            self.assertEqual(len(os.listdir(directory)), 3)
+            built = VisibilityGraph(world.startPoint, world.goalPoint, world.walls, world.allowedArea, cacheDirectory=None)
+            cached = VisibilityGraph(world.startPoint, world.goalPoint, world.walls, world.allowedArea, cacheDirectory=directory)
+            self.assertEqual(cached.edges, built.edges)
+            self.assertEqual(cached.distances, built.distances)
+            self.assertEqual(cached.shortestRouteEdges, built.shortestRouteEdges)
+            cachedOracle = GoalDistanceOracle(world.goalPoint, world.walls, world.allowedArea, cacheDirectory=directory)
+            self.assertTrue(np.array_equal(cachedOracle.distances(points), oracle.distances(points)))
+            field = DistanceField(world.goalPoint, world.walls, world.allowedArea, 10, directory)
+            self.assertEqual(field.key, keys[0])
+            self.assertEqual(len(os.listdir(directory)), 3)
+            # another cache version never loads these files
+            with patch('src.path_finding.CACHE_VERSION', path_finding.CACHE_VERSION+1):
+                self.assertNotEqual(DistanceField(world.goalPoint, world.walls, world.allowedArea, 10, None).key, keys[0])
+                VisibilityGraph(world.startPoint, world.goalPoint, world.walls, world.allowedArea, cacheDirectory=directory)
+            self.assertEqual(len(os.listdir(directory)), 4)
+
 ################################################################################
 
 if __name__ == '__main__':
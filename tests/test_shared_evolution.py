@@ -0,0 +1,56 @@
+from unittest import TestCase, main
+import numpy as np
+from src.evolution import Evolution
+from src.shared_evolution import SharedEvolution
+from src.world import World
+
+################################################################################
+
+class TestSharedEvolution(TestCase):
+
+################################################################################
+
+    def testGeneration(self):
+        """
+        Same outcomes as a single process, including the generations shortened
+        by a win in another worker's slice.
+        """
+
+        world = World.default()
+        world = World(world.allowedArea, world.startPoint, (0, 300), 60, [])
+        evolution = Evolution(world, 30, seed=5)
+        with SharedEvolution(world, 30, seed=5, workers=3) as shared:
+            for _ in range(4):
+                evolution.runGeneration()
+                shared.runGeneration()
+                self.assertEqual(shared.counters, evolution.counters)
+                self.assertTrue(np.array_equal(shared.simulation.states, evolution.simulation.states))
+                self.assertTrue(np.array_equal(shared.simulation.steps, evolution.simulation.steps))
+                self.assertTrue(np.allclose(shared.simulation.positions, evolution.simulation.positions))
+                self.assertTrue(np.allclose(shared.fitness(), evolution.fitness()))
+                evolution.nextGeneration()
+                shared.nextGeneration()
+                self.assertTrue(np.array_equal(shared.genomes.angles, evolution.genomes.angles))
+            self.assertLess(evolution.maxVectorsCount, Evolution.VECTORS_COUNT)
+
+################################################################################
+
+    def testFixedWalls(self):
+        """
+        The workers keep their map, so the walls can't change.
+        """
+
+        world = World.default()
+        with SharedEvolution(world, 4, seed=5, workers=2) as shared:
+            with self.assertRaises(RuntimeError):
+                shared.addWall((-100, 300, 100, 310))
+            with self.assertRaises(RuntimeError):
+                shared.removeWall(world.wallsCustom[0])
+            self.assertEqual(shared.world.wallsCustom, world.wallsCustom)
+
+################################################################################
+
+if __name__ == '__main__':
+    main()
+
+################################################################################
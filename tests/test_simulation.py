@@ -0,0 +1,113 @@
+from unittest import TestCase, main
+import numpy as np
+from src.path_finding import GoalDistanceOracle
+from src.simulation import Simulation
+from src.trajectory import Trajectories
+
+################################################################################
+
+class TestSimulation(TestCase):
+
+################################################################################
+
+    def setUp(self):
+        """
+
+        """
+
+        self._start = (0, 0)
+        self._goal = (0, -100)
+        self._tolerance = 25
+        self._wall = (-50, 40, 50, 50)
+
+################################################################################
+
+    def _simulation(self, angles, maxVectorsCount=10):
+        """
+
+        """
+
+        return Simulation(self._start, self._goal, self._tolerance, [self._wall], angles, maxVectorsCount)
+
+################################################################################
+
+    def testAccelerationLimit(self):
+        """
+
+        """
+
+        simulation = self._simulation(np.zeros((1, 10)))
+        for _ in range(8):
+            simulation.step()
+        self.assertAlmostEqual(simulation.accelerations[0, 0], Simulation.ACCELERATION_LIMIT)
+        self.assertEqual(simulation.velocities[0, 0], 1+2+3+4+5+5+5+5)
+
+################################################################################
+
+    def testOutcomes(self):
+        """
+
+        """
+
+        up = np.full(10, -np.pi/2)
+        down = np.full(10, np.pi/2)
+        left = np.full(10, np.pi)
+        simulation = self._simulation(np.stack((up, down, left)))
+        simulation.run()
+        states = [Simulation.State(state) for state in simulation.states]
+        self.assertEqual(states, [Simulation.State.WON, Simulation.State.DEAD, Simulation.State.EXHAUSTED])
+        # the winner shortened the allowed vectors count for everyone else
+        self.assertEqual(simulation.maxVectorsCount, simulation.steps[0])
+        self.assertEqual(simulation.steps[2], simulation.steps[0])
+        self.assertTrue(np.allclose(simulation.positions[1], (0, 1+3+6+10+15)))
+
+################################################################################
+
+    def testPruning(self):
+        """
+        With a vectors count below the genes count, the dots heading away are
+        exhausted early and the winner is not.
+        """
+
+        up = np.full(30, -np.pi/2)
+        left = np.full(30, np.pi)
+        angles = np.stack((up, left, left))
+        goal = (0, -600)
+        oracle = GoalDistanceOracle(goal, [self._wall], (-1000, -1000, 1000, 1000))
+        full = Simulation(self._start, goal, self._tolerance, [self._wall], angles, 26)
+        full.run()
+        pruned = Simulation(self._start, goal, self._tolerance, [self._wall], angles, 26, pruning=oracle)
+        pruned.run()
+        self.assertEqual(pruned.states.tolist(), full.states.tolist())
+        self.assertEqual(pruned.steps[0], full.steps[0])
+        self.assertEqual(pruned.maxVectorsCount, full.maxVectorsCount)
+        self.assertEqual(pruned.prunedCount, 2)
+        self.assertTrue((pruned.steps[1:] < full.steps[1:]).all())
+        self.assertEqual(pruned.savedSteps, (26-pruned.steps[1:]).sum())
+        self.assertLess(pruned.simulatedSteps, full.simulatedSteps)
+
+################################################################################
+
+    def testResumeAtLimit(self):
+        """
+        A dot resumed at maxVectorsCount is exhausted there, as from scratch,
+        instead of dying or winning one step past the limit.
+        """
+
+        angles = np.full((1, 30), np.pi)
+        for goal, tolerance, walls in (((0, -100), 25, [(-220, -50, -210, 50)]), ((-230, 0), 20, [])):
+            parent = Simulation(self._start, goal, tolerance, walls, angles, 10, Trajectories(1, 30))
+            parent.run()
+            self.assertEqual((parent.states[0], parent.steps[0]), (Simulation.State.EXHAUSTED.value, 10))
+            child = Simulation(self._start, goal, tolerance, walls, angles, 10, Trajectories(1, 30))
+            child.resume(np.array([0]), parent.trajectories, np.array([0]), np.array([10]))
+            child.run()
+            self.assertEqual((child.states[0], child.steps[0]), (Simulation.State.EXHAUSTED.value, 10))
+            self.assertEqual(child.maxVectorsCount, 10)
+
+################################################################################
+
+if __name__ == '__main__':
+    main()
+
+################################################################################